@@ -3,16 +3,22 @@ from __future__ import annotations
 import os
 from typing import Optional
 
+from agno.models.base import Model
 from agno.models.google import Gemini
 
+# "gemini" (default) or "stub": a scripted offline model for benchmarks/CI (see app/agent/stub_llm.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").strip().lower()
+
 
 class LLMConfigError(RuntimeError):
     """Raised when required LLM configuration is missing or invalid."""
 
 
-def get_llm(model_id: Optional[str] = None) -> Gemini:
+def get_llm(model_id: Optional[str] = None) -> Model:
     """
-    Construct and return an Agno Gemini model instance.
+    Construct and return an Agno model instance for the configured LLM_BACKEND.
+
+    - LLM_BACKEND=stub returns a ScriptedModel driven by LLM_STUB_FIXTURE; no key or network needed.
 
     - Reads GOOGLE_API_KEY from the environment (required by Google's SDKs).
     - Model ID can be passed explicitly or via GEMINI_MODEL_ID env var.
@@ -22,6 +28,12 @@ def get_llm(model_id: Optional[str] = None) -> Gemini:
         from app.agent.llm import get_llm
         llm = get_llm()  # Gemini(id=...)
     """
+    if LLM_BACKEND == "stub":
+        from app.agent.stub_llm import ScriptedModel
+        return ScriptedModel()
+    if LLM_BACKEND != "gemini":
+        raise LLMConfigError(f"Unknown LLM_BACKEND '{LLM_BACKEND}' (expected 'gemini' or 'stub').")
+
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key or not api_key.strip():
         raise LLMConfigError(
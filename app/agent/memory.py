@@ -6,10 +6,19 @@ class SessionMemory:
     def __init__(self):
         self.prefs: Dict[str, Any] = {}  # e.g., {"date_col": "created_at"}
         self.history: List[Dict[str, Any]] = []
+        # Full results of the tools run this turn (the model only sees compacted copies)
+        self.tool_results: List[Dict[str, Any]] = []
         self.registry = DataRegistry()
 
     def remember(self, k, v):
         self.prefs[k] = v
 
     def recall(self, k, default=None):
-        return self.prefs.get(k, default)
\ No newline at end of file
+        return self.prefs.get(k, default)
+
+    def close(self) -> int:
+        """Release datasets and chart/preference state; returns the resident bytes reclaimed."""
+        self.prefs.clear()
+        self.history.clear()
+        self.tool_results.clear()
+        return self.registry.clear()
\ No newline at end of file
@@ -0,0 +1,213 @@
+from __future__ import annotations
+import inspect
+import re
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from app.agent.tools import (
+    tool_top_k, tool_plot, tool_describe, tool_filter_preview, tool_smart_explore, tool_suggest_analysis,
+)
+from app.services.metrics import span
+from app.services.utils import resolve_column
+
+# Rule-based planner for the common question shapes. A plan is only produced when
+# every column resolves cleanly; anything else falls through to the LLM agent.
+
+_LEAD = (
+    r"^(?:please\s+)?"
+    r"(?:(?:show|give|tell|list|find|get)\s+(?:me\s+)?|(?:what|who|which)\s+(?:are|is|were)\s+)?"
+    r"(?:the\s+)?"
+)
+_AGG = r"(?:(?P<agg>total|sum|average|avg|mean|count)\s+(?:of\s+)?)?"
+
+TOP_K_RE = re.compile(
+    _LEAD + r"top\s+(?P<k>\d+)?\s*(?P<group>[a-z_][\w ]*?)\s+by\s+" + _AGG + r"(?P<metric>[a-z_][\w ]*?)$"
+)
+PLOT_RE = re.compile(
+    _LEAD + r"(?:plot|chart|graph)\s+(?:of\s+)?(?:the\s+)?" + _AGG
+    + r"(?P<y>[a-z_][\w ]*?)(?:\s+trends?)?\s+(?:by|over|per|against|vs)\s+(?P<x>[a-z_][\w ]*?)"
+    r"(?:\s+as\s+an?\s+(?P<kind>bar|line|area)(?:\s+chart)?)?$"
+)
+DESCRIBE_RE = re.compile(
+    r"^(?:please\s+)?(?:describe|(?:give\s+me\s+)?(?:a\s+)?summary\s+of)\s+(?:the\s+)?"
+    r"(?:data|dataset)(?:\s+structure)?(?:\s+briefly)?$"
+)
+
+# Words that signal a compound request the planner should not guess at
+_CONNECTIVES = {"and", "or", "where", "with", "for", "in", "then", "except", "excluding"}
+_AGG_MAP = {"total": "sum", "sum": "sum", "average": "mean", "avg": "mean", "mean": "mean", "count": "count"}
+MAX_K = 100
+
+
+def _normalize(text: str) -> str:
+    t = re.sub(r"\s+", " ", text.strip().lower())
+    return t.rstrip("?.! ")
+
+
+def _resolve(df: pd.DataFrame, term: str) -> Optional[str]:
+    words = term.split()
+    if not words or len(words) > 3 or _CONNECTIVES.intersection(words):
+        return None
+    candidates = ["_".join(words)]
+    if candidates[0].endswith("es"):
+        candidates.append(candidates[0][:-2])
+    if candidates[0].endswith("s"):
+        candidates.append(candidates[0][:-1])
+    for cand in candidates:
+        # Exact or business-term matches only: a fuzzy match would drop qualifiers
+        # ("sales 2021", "net sales") without the model ever seeing the question
+        col = resolve_column(df, cand, fuzzy=False)
+        if col:
+            return col
+    return None
+
+
+def plan_message(message: str, df: pd.DataFrame, intent: str) -> Optional[Dict[str, Any]]:
+    """Turn an unambiguous question into a direct tool call, or return None."""
+    if intent not in ("TOP_K", "PLOT", "DESCRIBE"):
+        return None
+    text = _normalize(message)
+
+    if DESCRIBE_RE.match(text):
+        return {"tool": "describe", "args": {}}
+
+    m = PLOT_RE.match(text)
+    if m:
+        xcol, ycol = _resolve(df, m["x"]), _resolve(df, m["y"])
+        if not xcol or not ycol or xcol == ycol:
+            return None
+        agg = _AGG_MAP.get(m["agg"] or "", "sum")
+        if agg != "count" and not pd.api.types.is_numeric_dtype(df[ycol]):
+            return None
+        is_time = pd.api.types.is_datetime64_any_dtype(df[xcol])
+        kind = m["kind"] or ("line" if is_time else "bar")
+        return {"tool": "plot", "args": {"x": xcol, "y": ycol, "kind": kind, "agg": agg}}
+
+    m = TOP_K_RE.match(text)
+    if m:
+        gcol, mcol = _resolve(df, m["group"]), _resolve(df, m["metric"])
+        if not gcol or not mcol or gcol == mcol:
+            return None
+        if not pd.api.types.is_numeric_dtype(df[mcol]):
+            return None
+        agg = _AGG_MAP.get(m["agg"] or "", "sum")
+        if agg == "count":
+            return None
+        k = int(m["k"]) if m["k"] else 5
+        if not 0 < k <= MAX_K:
+            return None
+        return {"tool": "top_k", "args": {"metric": mcol, "group_by": gcol, "k": k, "agg": agg}}
+
+    return None
+
+
+def _invoke(fn, **kwargs) -> Dict[str, Any]:
+    # @tool wraps functions in an agno Function; call the undecorated function for the full result
+    return inspect.unwrap(getattr(fn, "entrypoint", fn))(**kwargs)
+
+
+def _fmt(v: Any) -> str:
+    if isinstance(v, float):
+        return f"{v:,.2f}"
+    if isinstance(v, int) and not isinstance(v, bool):
+        return f"{v:,}"
+    return str(v)
+
+
+def _reply_top_k(res: Dict[str, Any]) -> str:
+    used = res["used"]
+    lines = [f"**Top {len(res['table'])} {used['group_by']} by {used['agg']} of {used['metric']}:**", ""]
+    for i, row in enumerate(res["table"], 1):
+        lines.append(f"{i}. **{row[used['group_by']]}**: {_fmt(row[used['metric']])}")
+    return "\n".join(lines)
+
+
+def _reply_plot(res: Dict[str, Any]) -> str:
+    return res["description"] + "\n\nA chart has been generated below."
+
+
+def _reply_describe(res: Dict[str, Any]) -> str:
+    ncols = max(len(res["table"][0]) - 1, 0) if res["table"] else 0
+    return f"Here is a statistical summary of the dataset's {ncols} columns."
+
+
+def _reply_filter_preview(res: Dict[str, Any]) -> str:
+    if "count" not in res:
+        return f"Here are {len(res['rows'])} rows matching the filter."
+    return f"{_fmt(res['count'])} rows match the filter; the first {len(res['rows'])} are shown below."
+
+
+def _reply_smart_explore(res: Dict[str, Any]) -> str:
+    return "\n".join(res["insights"] + [f"- {line}" for line in res["key_columns"]])
+
+
+def _reply_suggest_analysis(res: Dict[str, Any]) -> str:
+    return "Here are some analyses you could try:\n" + "\n".join(f"- {s}" for s in res["suggestions"])
+
+
+# Agent tool name -> (tool, templated reply, key of the result's table). Only read-only tools
+# whose output fully answers the question can be replayed without the model.
+REPLAYABLE = {
+    "tool_top_k": (tool_top_k, _reply_top_k, "table"),
+    "tool_plot": (tool_plot, _reply_plot, None),
+    "tool_describe": (tool_describe, _reply_describe, "table"),
+    "tool_filter_preview": (tool_filter_preview, _reply_filter_preview, "rows"),
+    "tool_smart_explore": (tool_smart_explore, _reply_smart_explore, None),
+    "tool_suggest_analysis": (tool_suggest_analysis, _reply_suggest_analysis, None),
+}
+_PLANNER_TOOLS = {"top_k": "tool_top_k", "plot": "tool_plot", "describe": "tool_describe"}
+
+
+def recordable_plan(calls: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """The agent's tool calls for a turn as a replayable plan, or None if any can't be replayed.
+
+    `calls` are {"tool", "args", "error"} dicts; session_id is dropped from the args."""
+    steps = []
+    for call in calls:
+        if call["tool"] not in REPLAYABLE or call.get("error"):
+            return None
+        args = {k: v for k, v in (call.get("args") or {}).items() if k != "session_id"}
+        steps.append({"tool": call["tool"], "args": args})
+    return steps or None
+
+
+def result_tables(tool_results: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Record tables from full tool results (SessionMemory.tool_results), in call order."""
+    tables = []
+    for entry in tool_results:
+        _, _, table_key = REPLAYABLE.get(entry["tool"], (None, None, None))
+        table = entry["result"].get(table_key) if table_key and isinstance(entry["result"], dict) else None
+        if table:
+            tables.append(table)
+    return tables
+
+
+def replay_plan(session_id: str, steps: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Run recorded tool calls against the session's current data and template a reply.
+
+    Returns reply + tables, or None if any step fails (the caller then asks the model)."""
+    replies: List[str] = []
+    tables: List[List[Dict[str, Any]]] = []
+    try:
+        for step in steps:
+            fn, reply, table_key = REPLAYABLE[step["tool"]]
+            with span("tool", step["tool"]) as attrs:
+                res = _invoke(fn, session_id=session_id, **step["args"])
+                if "error" in res:
+                    attrs["error"] = str(res["error"])
+            if "error" in res:
+                return None
+            replies.append(reply(res))
+            if table_key:
+                tables.append(res[table_key])
+    except Exception:
+        return None
+    return {"reply": "\n\n".join(replies), "tables": tables}
+
+
+def execute_plan(session_id: str, plan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Run a plan against the session's data. Returns reply + tables, or None if the tool failed."""
+    tool = _PLANNER_TOOLS.get(plan["tool"])
+    if not tool:
+        return None
+    return replay_plan(session_id, [{"tool": tool, "args": plan["args"]}])
@@ -0,0 +1,311 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, MutableMapping, Optional
+from app.agent.memory import SessionMemory
+from app.services.frame_store import FRAMES, FrameStore
+
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "60"))
+# "memory" (per-process, lost on restart) or "disk" (SQLite + columnar files, shared by workers)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").strip().lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join("data", "sessions.sqlite3"))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join("data", "tables"))
+# Unreferenced table files younger than this are kept: a worker writes the file before
+# the session row that references it
+ORPHAN_FILE_GRACE_SECONDS = 600
+
+class SessionStore(MutableMapping[str, SessionMemory]):
+    """Interface for session backends: a mapping of session id -> SessionMemory.
+
+    Callers mutate a SessionMemory in place and then call save(sid) so backends that
+    keep state outside the process can write it through."""
+
+    def refresh(self, sid: str) -> None:
+        """Pick up changes other processes saved for a session (once per request)."""
+
+    def cached(self, sid: str) -> bool:
+        """Whether this process holds the session in memory; never loads or expires anything."""
+        return sid in self
+
+    def save(self, sid: str) -> None:
+        """Persist changes made to a session's memory."""
+
+    def sweep(self) -> int:
+        """Expire idle sessions; returns how many were removed."""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+class InMemorySessionStore(SessionStore):
+    """Bounded in-memory session map.
+
+    Sessions idle for longer than `ttl` seconds expire, and past `max_sessions` the
+    least-recently-used session is evicted. Expired/evicted/replaced sessions are closed,
+    which releases their datasets and chart state."""
+
+    def __init__(self, ttl: Optional[float] = None, max_sessions: Optional[int] = None):
+        self.ttl = SESSION_TTL_SECONDS if ttl is None else ttl
+        self.max_sessions = SESSION_MAX_COUNT if max_sessions is None else max_sessions
+        self._sessions: "OrderedDict[str, SessionMemory]" = OrderedDict()  # LRU first
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self.expired = 0
+        self.evicted = 0
+        self.reclaimed_bytes = 0
+
+    def _expired(self, sid: str, now: float) -> bool:
+        return self.ttl > 0 and now - self._last_seen[sid] > self.ttl
+
+    def _drop(self, sid: str) -> None:
+        mem = self._sessions.pop(sid)
+        self._last_seen.pop(sid, None)
+        self.reclaimed_bytes += mem.close()
+
+    def __getitem__(self, sid: str) -> SessionMemory:
+        with self._lock:
+            if sid not in self:
+                raise KeyError(sid)
+            self._sessions.move_to_end(sid)
+            self._last_seen[sid] = time.monotonic()
+            return self._sessions[sid]
+
+    def __setitem__(self, sid: str, mem: SessionMemory) -> None:
+        with self._lock:
+            old = self._sessions.get(sid)
+            if old is not None and old is not mem:
+                self.reclaimed_bytes += old.close()
+            self._sessions[sid] = mem
+            self._sessions.move_to_end(sid)
+            self._last_seen[sid] = time.monotonic()
+            while self.max_sessions > 0 and len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+                self.evicted += 1
+
+    def __delitem__(self, sid: str) -> None:
+        with self._lock:
+            self._drop(sid)
+
+    def __contains__(self, sid: object) -> bool:
+        with self._lock:
+            if sid not in self._sessions:
+                return False
+            if self._expired(sid, time.monotonic()):
+                self._drop(sid)
+                self.expired += 1
+                return False
+            return True
+
+    def cached(self, sid: str) -> bool:
+        with self._lock:
+            return sid in self._sessions
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._sessions))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            stale = [sid for sid in self._sessions if self._expired(sid, now)]
+            for sid in stale:
+                self._drop(sid)
+            self.expired += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "live": len(self._sessions),
+            "max": self.max_sessions,
+            "ttl_seconds": self.ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "reclaimed_bytes": self.reclaimed_bytes,
+        }
+
+
+class DiskSessionStore(InMemorySessionStore):
+    """Sessions persisted to SQLite (prefs, history, table keys) with tables stored as
+    columnar files under `data_dir`, so several uvicorn workers can serve the same
+    sessions and a restart doesn't lose uploads.
+
+    Each process keeps a bounded cache of live sessions and serves lookups from it;
+    refresh() (called at the start of each request) reloads a cached session when another
+    worker has saved a newer version of it. Idle expiry uses the shared last-seen
+    timestamp in the database, which save() updates.
+
+    Table files are read and written outside the store's lock (see FrameStore.persist),
+    so saving a large upload doesn't hold up lookups for other sessions."""
+
+    def __init__(self, db_path: Optional[str] = None, data_dir: Optional[str] = None,
+                 ttl: Optional[float] = None, max_sessions: Optional[int] = None):
+        super().__init__(ttl=ttl, max_sessions=max_sessions)
+        self.db_path = db_path or SESSION_DB_PATH
+        self.frames = FRAMES
+        self.frames.enable_persistence(data_dir or DATA_DIR)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY, prefs TEXT NOT NULL, history TEXT NOT NULL,"
+            " tables TEXT NOT NULL, active TEXT, version INTEGER NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._versions: Dict[str, int] = {}  # version of each cached session as loaded/saved
+
+    def _expired(self, sid: str, now: float) -> bool:
+        return False  # expiry is decided from the shared last_seen column in sweep()/_fetch()
+
+    def _fetch(self, sid: str) -> Optional[tuple]:
+        row = self._db.execute(
+            "SELECT prefs, history, tables, active, version, last_seen FROM sessions WHERE sid = ?", (sid,)
+        ).fetchone()
+        if row and self.ttl > 0 and time.time() - row[5] > self.ttl:
+            return None
+        return row
+
+    def _load(self, row: tuple) -> SessionMemory:
+        prefs, history, tables, active, _, _ = row
+        mem = SessionMemory()
+        mem.prefs.update(json.loads(prefs))
+        mem.history.extend(json.loads(history))
+        for name, key in json.loads(tables).items():
+            try:
+                mem.registry.attach(name, key)
+            except KeyError:
+                pass  # table file was removed; the session keeps its other state
+        if active in mem.registry.tables:
+            mem.registry.active = active
+        return mem
+
+    def _install(self, sid: str, row: tuple) -> None:
+        """Cache the session stored in `row`, unless another thread cached that version first."""
+        mem = self._load(row)  # maps its tables; done outside the lock
+        with self._lock:
+            if sid in self._sessions and self._versions.get(sid) == row[4]:
+                mem.close()
+                return
+            super().__setitem__(sid, mem)
+            self._versions[sid] = row[4]
+
+    def __contains__(self, sid: object) -> bool:
+        with self._lock:
+            if sid in self._sessions:
+                return True
+            row = self._fetch(sid)
+        if row is None:
+            return False
+        self._install(sid, row)
+        return True
+
+    def refresh(self, sid: str) -> None:
+        with self._lock:
+            if sid not in self._sessions:
+                return  # loaded from the database on first lookup
+            row = self._fetch(sid)
+            if row is None:
+                self._drop(sid)  # expired or deleted by another worker
+                return
+            if self._versions.get(sid) == row[4]:
+                return
+        self._install(sid, row)
+
+    def __setitem__(self, sid: str, mem: SessionMemory) -> None:
+        super().__setitem__(sid, mem)
+        self.save(sid)
+
+    def __delitem__(self, sid: str) -> None:
+        with self._lock:
+            if sid in self._sessions:
+                self._drop(sid)
+            self._db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+            self._db.commit()
+
+    def _drop(self, sid: str) -> None:
+        super()._drop(sid)
+        self._versions.pop(sid, None)
+
+    def save(self, sid: str) -> None:
+        persisted: Dict[str, str] = {}
+        while True:
+            with self._lock:
+                mem = self._sessions.get(sid)
+                if mem is None:
+                    return
+                tables = dict(mem.registry.tables)
+                if tables == persisted:
+                    break
+            # Table files first (outside the lock), so the row never references a missing file
+            for key in tables.values():
+                self.frames.persist(key)
+            persisted = tables
+        with self._lock:
+            if self._sessions.get(sid) is not mem:
+                return  # dropped or replaced meanwhile (a replacement saves itself)
+            # The version is bumped in SQL, so concurrent saves from two workers never
+            # produce the same number and each sees the other's write as newer
+            (version,) = self._db.execute(
+                "INSERT INTO sessions (sid, prefs, history, tables, active, version, last_seen)"
+                " VALUES (?, ?, ?, ?, ?, 1, ?)"
+                " ON CONFLICT(sid) DO UPDATE SET prefs = excluded.prefs, history = excluded.history,"
+                " tables = excluded.tables, active = excluded.active, version = sessions.version + 1,"
+                " last_seen = excluded.last_seen"
+                " RETURNING version",
+                (sid, json.dumps(mem.prefs, default=str), json.dumps(mem.history, default=str),
+                 json.dumps(tables), mem.registry.active, time.time()),
+            ).fetchone()
+            self._db.commit()
+            self._versions[sid] = version
+
+    def sweep(self) -> int:
+        """Delete expired sessions from the database and the cache, then remove table
+        files that no session references any more (and that weren't just written)."""
+        with self._lock:
+            removed = 0
+            if self.ttl > 0:
+                cutoff = time.time() - self.ttl
+                stale = [r[0] for r in self._db.execute("SELECT sid FROM sessions WHERE last_seen < ?", (cutoff,))]
+                self._db.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,))
+                self._db.commit()
+                for sid in stale:
+                    if sid in self._sessions:
+                        self._drop(sid)
+                removed = len(stale)
+                self.expired += removed
+
+            referenced = set()
+            for (tables,) in self._db.execute("SELECT tables FROM sessions"):
+                referenced.update(FrameStore.file_stem(k) for k in json.loads(tables).values())
+        cutoff = time.time() - ORPHAN_FILE_GRACE_SECONDS
+        for fname in os.listdir(self.frames.persist_dir):
+            stem, ext = os.path.splitext(fname)
+            path = os.path.join(self.frames.persist_dir, fname)
+            if ext not in (".feather", ".pkl") or stem in referenced:
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass  # removed by another worker's sweep
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (stored,) = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return {**super().stats(), "backend": "disk", "stored": stored}
+
+def make_session_store() -> SessionStore:
+    """Session backend selected by SESSION_STORE."""
+    if SESSION_STORE == "disk":
+        return DiskSessionStore()
+    return InMemorySessionStore()
@@ -0,0 +1,124 @@
+# app/agent/stub_llm.py
+from __future__ import annotations
+import asyncio
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterator, List
+from uuid import uuid4
+
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LLM_STUB_FIXTURE = os.getenv("LLM_STUB_FIXTURE") or os.path.join(_REPO_ROOT, "benchmarks", "fixtures", "stub_llm.json")
+# Simulated model latency per call, in milliseconds
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+
+_SESSION_RE = re.compile(r"\[SESSION_ID:\s*([^\]]+?)\s*\]")
+# Injected by the app ahead of the question (see main._agent_message); not the user's words
+_CONTEXT_RE = re.compile(r"\[DATA_CONTEXT\].*?\[/DATA_CONTEXT\]", re.DOTALL)
+
+
+@lru_cache(maxsize=8)
+def load_fixture(path: str) -> Dict[str, Any]:
+    """Read a script: {"rules": [{"match", "tool_calls", "reply"}, ...], "default": {"reply"}}.
+
+    Parsed once per path; build_agent() creates a model per request."""
+    with open(path) as fh:
+        script = json.load(fh)
+    for rule in script.get("rules", []):
+        rule["pattern"] = re.compile(rule["match"], re.IGNORECASE)
+    return script
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+@dataclass
+class ScriptedModel(Model):
+    """Deterministic offline model for benchmarks and CI.
+
+    The first call of a turn finds the first rule whose `match` regex hits the user's question
+    (without the [SESSION_ID]/[DATA_CONTEXT] prefix) and asks for that rule's tool calls (the session id is filled in from the message). Once
+    tool results are in, it answers with the rule's `reply`. Token usage is estimated from
+    text length so the metrics pipeline sees plausible numbers."""
+
+    id: str = "scripted-stub"
+    name: str = "ScriptedModel"
+    provider: str = "Stub"
+
+    fixture: str = LLM_STUB_FIXTURE
+    latency_ms: float = LLM_STUB_LATENCY_MS
+    script: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        super().__post_init__()
+        if not self.script:
+            self.script = load_fixture(self.fixture)
+
+    def _rule(self, message: str) -> Dict[str, Any]:
+        for rule in self.script.get("rules", []):
+            if rule["pattern"].search(message):
+                return rule
+        return self.script.get("default", {"reply": "I can help you explore this dataset."})
+
+    def _respond(self, messages: List[Message]) -> Dict[str, Any]:
+        user = next((m for m in reversed(messages) if m.role == "user"), None)
+        text = user.get_content_string() if user else ""
+        rule = self._rule(_CONTEXT_RE.sub("", _SESSION_RE.sub("", text)))
+        prompt = sum(_tokens(m.get_content_string() or "") for m in messages)
+
+        if messages[-1].role != "tool" and rule.get("tool_calls"):
+            session = _SESSION_RE.search(text)
+            calls = []
+            for call in rule["tool_calls"]:
+                args = dict(call.get("arguments", {}))
+                if session:
+                    args.setdefault("session_id", session.group(1))
+                calls.append({"id": str(uuid4()), "type": "function",
+                              "function": {"name": call["name"], "arguments": json.dumps(args)}})
+            return {"content": None, "tool_calls": calls,
+                    "usage": {"input_tokens": prompt, "output_tokens": _tokens(json.dumps(calls))}}
+
+        reply = rule.get("reply", "")
+        return {"content": reply, "tool_calls": [],
+                "usage": {"input_tokens": prompt, "output_tokens": _tokens(reply)}}
+
+    def invoke(self, messages: List[Message], **kwargs) -> Dict[str, Any]:
+        time.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+    async def ainvoke(self, messages: List[Message], **kwargs) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._respond(messages)
+
+    def _chunks(self, response: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        if response["tool_calls"]:
+            yield response
+            return
+        words = re.findall(r"\S+\s*", response["content"] or "") or [""]
+        for i, word in enumerate(words):
+            yield {"content": word, "tool_calls": [],
+                   "usage": response["usage"] if i == len(words) - 1 else None}
+
+    def invoke_stream(self, messages: List[Message], **kwargs) -> Iterator[Dict[str, Any]]:
+        time.sleep(self.latency_ms / 1000)
+        yield from self._chunks(self._respond(messages))
+
+    async def ainvoke_stream(self, messages: List[Message], **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        for chunk in self._chunks(self._respond(messages)):
+            yield chunk
+
+    def parse_provider_response(self, response: Dict[str, Any], **kwargs) -> ModelResponse:
+        return ModelResponse(role="assistant", content=response["content"],
+                             tool_calls=list(response["tool_calls"]), response_usage=response["usage"])
+
+    def parse_provider_response_delta(self, response: Dict[str, Any]) -> ModelResponse:
+        return self.parse_provider_response(response)
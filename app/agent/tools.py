@@ -1,69 +1,59 @@
 from __future__ import annotations
-import io
-import re
-from typing import Any, Dict, List, Optional
+import functools
+import hashlib
+from typing import Any, Dict, List, MutableMapping, Optional
 
+import numpy as np
 import pandas as pd
 from agno.tools import tool
 from app.agent.memory import SessionMemory
 from app.services.plotting import plot_and_save, PLOT_DIR
-from app.services.utils import snake_case, infer_schema, resolve_column, closest, smart_column_finder
+from app.services.ingest import load_upload
+from app.services.compact import compact_result
+from app.services.filters import FilterError, FilterPlan, compile_filter
+from app.services.indexes import DATA_INDEXES, CategoryIndex, DatasetIndexes, TimeIndex
+from app.services.metrics import span
+from app.services.result_cache import ResultCache
+from app.services.utils import as_datetime64, resolve_column, closest, smart_column_finder
 
 # This dict is injected by FastAPI at startup so tools can access sessions.
-SESSIONS: Dict[str, SessionMemory] = {}
+SESSIONS: MutableMapping[str, SessionMemory] = {}
 
 def get_or_create_session(session_id: str) -> SessionMemory:
     if session_id not in SESSIONS:
         SESSIONS[session_id] = SessionMemory()
     return SESSIONS[session_id]
 
+def model_result(fn):
+    """Give the model a compacted copy of a tool's result and keep the full one in the
+    session's tool_results for the UI. inspect.unwrap() reaches the undecorated tool."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span("tool", fn.__name__) as attrs:
+            result = fn(*args, **kwargs)
+            if isinstance(result, dict) and "error" in result:
+                attrs["error"] = str(result["error"])
+        session_id = kwargs.get("session_id", args[0] if args else None)
+        if session_id in SESSIONS:
+            SESSIONS[session_id].tool_results.append({"tool": fn.__name__, "result": result})
+        return compact_result(result)
+    return wrapper
+
 @tool
 def tool_load_csv(session_id: str, file_bytes: bytes, name: str = "dataset") -> Dict[str, Any]:
     """Load a CSV or Excel into the active session (schema-agnostic)."""
     mem = get_or_create_session(session_id)
+    key, df, memory = load_upload(file_bytes, hashlib.sha256(file_bytes).hexdigest())
+    mem.registry.put(name, df, key=key)
+    memory = mem.registry.cached("memory", lambda _df: memory)
+    schema = session_explore(mem)["schema"]
+    build_indexes(mem)
+    return {"session_id": session_id, "name": name, "rows": len(df), "cols": list(df.columns), "schema": schema, "memory": memory}
 
-    # Try CSV
-    try:
-        buf = io.BytesIO(file_bytes); buf.seek(0)
-        df = pd.read_csv(buf)
-    except Exception:
-        # Fallback to Excel
-        buf = io.BytesIO(file_bytes); buf.seek(0)
-        df = pd.read_excel(buf, sheet_name=0)
-
-    # Normalize headers
-    df.columns = [snake_case(c) for c in df.columns]
-
-    # Opportunistic typing: dates & numerics (safe, non-destructive)
-    for c in df.columns:
-        # date-like
-        if any(tok in c for tok in ["date", "time", "timestamp"]):
-            try:
-                df[c] = pd.to_datetime(df[c], errors="ignore")
-            except Exception:
-                pass
-        # numeric coercion for string/object columns
-        if df[c].dtype == object:
-            try:
-                coerced = pd.to_numeric(df[c], errors="coerce")
-                if coerced.notna().sum() > max(10, int(0.5 * len(df))):
-                    df[c] = coerced
-            except Exception:
-                pass
-
-    mem.registry.put(name, df)
-    schema = infer_schema(df)
-    return {"session_id": session_id, "name": name, "rows": len(df), "cols": list(df.columns), "schema": schema}
-
-@tool
-def tool_smart_explore(session_id: str) -> Dict[str, Any]:
-    """Smart data exploration - automatically identifies key columns and provides insights."""
-    mem = get_or_create_session(session_id)
-    df = mem.registry.get()
-    
+def explore_dataset(df: pd.DataFrame, schema: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Key columns, schema buckets and basic insights for a dataset."""
     # Get smart column mapping
     smart_cols = smart_column_finder(df, "explore")
-    schema = infer_schema(df)
     
     # Generate insights
     insights = []
@@ -92,7 +82,59 @@ def tool_smart_explore(session_id: str) -> Dict[str, Any]:
         "columns": list(df.columns)
     }
 
+def session_explore(mem: SessionMemory) -> Dict[str, Any]:
+    """explore_dataset() for the active table, computed once per dataset version."""
+    return mem.registry.cached("explore", lambda df: explore_dataset(df, mem.registry.profile().schema))
+
+CONTEXT_MAX_COLS = 50
+
+def explore_context(explore: Dict[str, Any]) -> str:
+    """Compact text form of explore_dataset() for the prompt, so the agent can skip tool_smart_explore."""
+    def cols(names: List[str]) -> str:
+        extra = len(names) - CONTEXT_MAX_COLS
+        shown = ", ".join(names[:CONTEXT_MAX_COLS])
+        return shown + (f", ... ({extra} more)" if extra > 0 else "") if names else "-"
+
+    schema = explore["schema"]
+    bucketed = set(schema["numeric"]) | set(schema["datetime"]) | set(schema["categorical"])
+    lines = [
+        "[DATA_CONTEXT]",
+        explore["insights"][0],
+        f"numeric: {cols(schema['numeric'])}",
+        f"datetime: {cols(schema['datetime'])}",
+        f"categorical: {cols(schema['categorical'])}",
+        f"other: {cols([c for c in explore['columns'] if c not in bucketed])}",
+        "smart_columns: " + (", ".join(f"{k}={v}" for k, v in explore["smart_columns"].items()) or "-"),
+        "[/DATA_CONTEXT]",
+    ]
+    return "\n".join(lines)
+
+def session_results(mem: SessionMemory) -> ResultCache:
+    """Tool-result cache for the active dataset version; replaced along with the table."""
+    return mem.registry.cached("results", lambda _df: ResultCache())
+
+def session_indexes(mem: SessionMemory) -> Optional[DatasetIndexes]:
+    """Bitmap indexes on the active dataset's categorical columns and time orders on its date columns."""
+    if not DATA_INDEXES:
+        return None
+    schema = mem.registry.profile().schema
+    return mem.registry.cached("indexes", lambda _df: DatasetIndexes(schema["categorical"], schema["datetime"]))
+
+def build_indexes(mem: SessionMemory) -> None:
+    """Build the time indexes at upload; categorical bitmaps stay lazy."""
+    indexes = session_indexes(mem)
+    if indexes is not None:
+        indexes.build_times(mem.registry.get())
+
+@tool
+@model_result
+def tool_smart_explore(session_id: str) -> Dict[str, Any]:
+    """Smart data exploration - automatically identifies key columns and provides insights."""
+    mem = get_or_create_session(session_id)
+    return session_explore(mem)
+
 @tool
+@model_result
 def tool_describe(session_id: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
     mem = get_or_create_session(session_id)
     df = mem.registry.get()
@@ -102,11 +144,13 @@ def tool_describe(session_id: str, columns: Optional[List[str]] = None) -> Dict[
             resolved = col if col in df.columns else resolve_column(df, col)
             if resolved:
                 sel_cols.append(resolved)
-    sel = df if not sel_cols else df[sel_cols]
-    desc = sel.describe(include="all", datetime_is_numeric=True).fillna("")
-    return {"table": desc.reset_index().to_dict(orient="records")}
+    return session_results(mem).get_or_compute(
+        ("describe", tuple(sel_cols)),
+        lambda: {"table": mem.registry.profile().describe(sel_cols or None)},
+    )
 
 @tool
+@model_result
 def tool_top_k(session_id: str, metric: str, group_by: str, k: int = 5, agg: str = "sum") -> Dict[str, Any]:
     """Top-k groups by a numeric metric (sum/mean). Works with any CSV via dynamic resolution."""
     mem = get_or_create_session(session_id)
@@ -120,38 +164,73 @@ def tool_top_k(session_id: str, metric: str, group_by: str, k: int = 5, agg: str
     if not gcol:
         return {"error": f"Group '{group_by}' not found.", "candidates": closest(df, group_by)}
     if not pd.api.types.is_numeric_dtype(df[mcol]):
-        return {"error": f"Column '{mcol}' is not numeric.", "numeric_candidates": infer_schema(df)["numeric"]}
+        return {"error": f"Column '{mcol}' is not numeric.", "numeric_candidates": mem.registry.profile().numeric_columns()}
+
+    agg = "mean" if agg == "mean" else "sum"
+    return session_results(mem).get_or_compute(("top_k", mcol, gcol, k, agg), lambda: _top_k(df, mcol, gcol, k, agg, session_indexes(mem)))
 
+def _grouped(df: pd.DataFrame, xcol: str, ycol: str, agg: str, indexes: Optional[DatasetIndexes]) -> pd.DataFrame:
+    """`df.groupby(xcol)[ycol].<agg>()` as a frame; a bincount over the index codes when xcol is indexed."""
+    index = indexes.get(df, xcol) if indexes is not None else None
+    if isinstance(index, CategoryIndex) and (agg == "count" or pd.api.types.is_numeric_dtype(df[ycol])):
+        return index.group(df[ycol], agg).rename_axis(xcol).reset_index()
+    return getattr(df.groupby(xcol, observed=True)[ycol], agg)().reset_index()
+
+def _top_k(df: pd.DataFrame, mcol: str, gcol: str, k: int, agg: str, indexes: Optional[DatasetIndexes] = None) -> Dict[str, Any]:
     try:
-        series = df.groupby(gcol)[mcol]
-        out = (series.mean(numeric_only=True) if agg == "mean" else series.sum(numeric_only=True))
-        out = out.sort_values(ascending=False).head(k).reset_index()
+        out = _grouped(df, gcol, mcol, agg, indexes)
+        out = out.sort_values(mcol, ascending=False).head(k).reset_index(drop=True)
     except Exception as e:
         return {"error": str(e)}
 
     return {"table": out.to_dict(orient="records"), "used": {"metric": mcol, "group_by": gcol, "agg": agg}}
 
 @tool
-def tool_filter_preview(session_id: str, query: str, limit: int = 20) -> Dict[str, Any]:
-    """Apply a basic pandas query; return a small preview or error + suggestions."""
+@model_result
+def tool_filter_preview(session_id: str, query: str, limit: int = 20, exact_count: bool = True) -> Dict[str, Any]:
+    """Filter rows and return a small preview plus the number of matches.
+
+    Filter syntax: comparisons (==, !=, <, <=, >, >=, ranges like 10 <= price < 20),
+    col in ['a', 'b'], col between 1 and 5, col contains 'text' (also startswith/endswith),
+    combined with and/or/not and parentheses. Set exact_count=false when only example
+    rows are needed; the scan then stops after `limit` matches."""
     mem = get_or_create_session(session_id)
     df = mem.registry.get()
     try:
-        # Safety: allow only a restricted character set
-        if not re.fullmatch(r"[\w\s\=\!\<\>\&\|\'\"\-\:\.\,\(\)]+", query):
-            return {"error": "Query contains unsupported characters."}
-        out = df.query(query)
-        sample = out.head(limit)
-        return {"rows": sample.to_dict(orient="records"), "count": len(out)}
-    except Exception as e:
-        return {"error": f"Bad filter: {e}", "candidates": [
-            "pick a valid column like: " + ", ".join(df.columns[:5]),
-            "example: col_a > 10 & col_b == 'X'",
-        ]}
+        plan = compile_filter(query)
+    except FilterError as e:
+        return _bad_filter(df, e)
+    return session_results(mem).get_or_compute(
+        ("filter_preview", plan.text, limit, exact_count), lambda: _filter_preview(df, plan, limit, exact_count, session_indexes(mem))
+    )
+
+def _bad_filter(df: pd.DataFrame, e: Exception) -> Dict[str, Any]:
+    return {"error": f"Bad filter: {e}", "candidates": [
+        "pick a valid column like: " + ", ".join(df.columns[:5]),
+        "example: col_a > 10 & col_b == 'X'",
+        "example: col_b in ['X', 'Y'] and col_c contains 'abc'",
+    ]}
+
+def _filter_preview(df: pd.DataFrame, plan: FilterPlan, limit: int, exact_count: bool,
+                    indexes: Optional[DatasetIndexes] = None) -> Dict[str, Any]:
+    try:
+        if exact_count:
+            # One vectorized mask gives both the count and the preview rows; the filtered frame is never built
+            positions = np.flatnonzero(plan.mask(df, indexes))
+            sample = df.iloc[positions[:limit]]
+            return {"rows": sample.to_dict(orient="records"), "count": int(len(positions))}
+        sample = plan.preview(df, limit)
+        return {"rows": sample.to_dict(orient="records"), "matched_at_least": len(sample)}
+    except FilterError as e:
+        return _bad_filter(df, e)
 
 @tool
-def tool_plot(session_id: str, x: str, y: str, kind: str = "line", agg: Optional[str] = None, filename: Optional[str] = None) -> Dict[str, Any]:
-    """Create a Plotly chart data for rendering in UI. Dynamically resolves columns. Returns chart data, table, and description."""
+@model_result
+def tool_plot(session_id: str, x: str, y: str, kind: str = "line", agg: Optional[str] = None, filename: Optional[str] = None,
+              start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    """Create a Plotly chart data for rendering in UI. Dynamically resolves columns. Returns chart data, table, and description.
+
+    For a date x axis, `start`/`end` (dates, inclusive) limit the chart to that time window."""
     mem = get_or_create_session(session_id)
     df = mem.registry.get()
 
@@ -164,28 +243,61 @@ def tool_plot(session_id: str, x: str, y: str, kind: str = "line", agg: Optional
         if not ycol: missing.append(f"y:'{y}'")
         return {"error": f"Column(s) not found: {', '.join(missing)}", "have": list(df.columns)}
 
+    indexes = session_indexes(mem)
+    if start or end:
+        if not pd.api.types.is_datetime64_any_dtype(df[xcol]):
+            return {"error": f"start/end need a date column on x; '{xcol}' is {df[xcol].dtype}."}
+        try:
+            df = _time_window(df, xcol, start, end, indexes)
+        except (ValueError, TypeError) as e:
+            return {"error": f"Bad time window: {e}"}
+        indexes = None  # they cover the whole table, not the window
+
+    result = session_results(mem).get_or_compute(
+        ("plot", xcol, ycol, kind, agg, start, end), lambda: _plot(df, xcol, ycol, kind, agg, indexes)
+    )
+    if "error" not in result:
+        # Store chart data in session memory for frontend to retrieve (on cache hits too)
+        mem.remember("last_chart", result["chart"])
+    return {k: v for k, v in result.items() if k != "chart"}
+
+def _time_window(df: pd.DataFrame, col: str, start: Optional[str], end: Optional[str],
+                 indexes: Optional[DatasetIndexes]) -> pd.DataFrame:
+    """Rows with start <= df[col] <= end; a binary search on the time index instead of a scan when there is one."""
+    s = as_datetime64(df[col])
+    low, high = (None if v is None else _timestamp(s, v) for v in (start, end))
+    index = indexes.get(df, col) if indexes is not None else None
+    window = index.window(low, high) if isinstance(index, TimeIndex) else None
+    if window is not None:
+        return df.iloc[index.positions(*window)]
+    mask = s.notna()
+    if low is not None:
+        mask &= s >= low
+    if high is not None:
+        mask &= s <= high
+    return df[mask]
+
+def _timestamp(s: pd.Series, value: str) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize(s.dt.tz) if s.dt.tz is not None and ts.tz is None else ts
+
+def _plot(df: pd.DataFrame, xcol: str, ycol: str, kind: str, agg: Optional[str],
+          indexes: Optional[DatasetIndexes] = None) -> Dict[str, Any]:
     try:
         # Prepare data for the plot (aggregated if needed)
         plot_data = df.copy()
         if agg and agg in ["sum", "mean", "count"]:
-            if agg == "sum":
-                plot_data = df.groupby(xcol)[ycol].sum().reset_index()
-            elif agg == "mean":
-                plot_data = df.groupby(xcol)[ycol].mean().reset_index()
-            elif agg == "count":
-                plot_data = df.groupby(xcol)[ycol].count().reset_index()
+            plot_data = _grouped(df, xcol, ycol, agg, indexes)
         
         # Get the data table (limit to reasonable size)
         table_data = plot_data[[xcol, ycol]].head(50).to_dict(orient="records")
         
-        # Store chart data in session memory for frontend to retrieve
         chart_info = {
             "x": xcol,
             "y": ycol, 
             "kind": kind,
             "data": table_data
         }
-        mem.remember("last_chart", chart_info)
         
         # Generate description
         total_points = len(plot_data)
@@ -206,18 +318,20 @@ def tool_plot(session_id: str, x: str, y: str, kind: str = "line", agg: Optional
             "table": table_data,
             "description": description,
             "used": {"x": xcol, "y": ycol, "agg": agg, "kind": kind},
-            "total_rows": total_points
+            "total_rows": total_points,
+            "chart": chart_info,
         }
     except Exception as e:
         return {"error": str(e), "have": list(df.columns)}
 
 @tool
+@model_result
 def tool_suggest_analysis(session_id: str) -> Dict[str, Any]:
     """Suggest specific analysis options when user request is vague."""
     mem = get_or_create_session(session_id)
     df = mem.registry.get()
     smart_cols = smart_column_finder(df, "suggest")
-    schema = infer_schema(df)
+    schema = mem.registry.profile().schema
     
     suggestions = []
     
@@ -240,7 +354,10 @@ def tool_suggest_analysis(session_id: str) -> Dict[str, Any]:
     if schema['categorical']:
         suggestions.append(f"Distribution analysis of {', '.join(schema['categorical'][:2])}")
     
+    return {"suggestions": suggestions}
+
 @tool
+@model_result
 def tool_fallback_help(session_id: str, error_context: str) -> Dict[str, Any]:
     """Provide helpful alternatives when other tools fail."""
     mem = get_or_create_session(session_id)
@@ -255,7 +372,7 @@ def tool_fallback_help(session_id: str, error_context: str) -> Dict[str, Any]:
             alternatives.append("Key business columns found: " + ", ".join([f"{k}={v}" for k, v in smart_cols.items()]))
     
     if "plot" in error_context.lower() or "chart" in error_context.lower():
-        numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+        numeric_cols = mem.registry.profile().numeric_columns()
         if numeric_cols:
             alternatives.append(f"Try plotting these numeric columns: {', '.join(numeric_cols[:3])}")
     
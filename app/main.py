@@ -1,37 +1,98 @@
 from __future__ import annotations
+import asyncio
+import json
 import os
 import re
 import uuid
-from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 
+from anyio import CancelScope, CapacityLimiter, to_thread
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from app.agent.agent import agent
+from agno.run.response import RunEvent
+from app.agent.agent import build_agent
 from app.agent.memory import SessionMemory
+from app.agent.session_store import make_session_store, SESSION_SWEEP_SECONDS
 from app.agent.router import detect_intent
+from app.agent.planner import plan_message, execute_plan, recordable_plan, replay_plan, result_tables
 from app.agent import tools as tools_module
+from app.agent.tools import build_indexes, get_or_create_session, session_explore, explore_context
+from app.services.ingest import spool_to_disk, load_upload
+from app.services.frame_store import FRAMES
+from app.services import result_cache
+from app.services.answer_cache import ANSWERS, PLANS, dataset_fingerprint, schema_fingerprint
+from app.services.metrics import METRICS, Trace, record_llm_metrics, span, start_trace
 
 from dotenv import load_dotenv
 
 
 load_dotenv()
 
-# In-memory sessions (swap with Redis/Postgres in production)
-SESSIONS: Dict[str, SessionMemory] = {}
+# In-memory sessions with idle TTL + LRU cap (swap with Redis/Postgres in production)
+SESSIONS = make_session_store()
 
-def ensure_session(session_id: Optional[str]) -> str:
-    sid = session_id or str(uuid.uuid4())
+def _ensure_session(sid: str) -> None:
+    SESSIONS.refresh(sid)
     if sid not in SESSIONS:
         SESSIONS[sid] = SessionMemory()
+
+async def ensure_session(session_id: Optional[str]) -> str:
+    # Off the loop: the disk store may query SQLite and map table files here
+    sid = session_id or str(uuid.uuid4())
+    await to_thread.run_sync(_ensure_session, sid)
     return sid
 
 # Inject global SESSIONS into tools module so @tool functions can access it
 tools_module.SESSIONS = SESSIONS
 
-app = FastAPI(title="Conversational Data Explorer (Agno + Gemini + Plotly)")
+# Blocking work (Gemini round-trips, pandas) runs in a bounded worker pool so one slow
+# agent run doesn't stall /health, /upload or other sessions on the event loop.
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+_chat_limiter: Optional[CapacityLimiter] = None
+SESSION_LOCKS: Dict[str, asyncio.Lock] = {}
+
+def session_lock(sid: str) -> asyncio.Lock:
+    """Serializes requests for one session so they don't interleave on its SessionMemory."""
+    if sid not in SESSION_LOCKS:
+        SESSION_LOCKS[sid] = asyncio.Lock()
+    return SESSION_LOCKS[sid]
+
+async def run_in_chat_pool(fn, *args):
+    global _chat_limiter
+    if _chat_limiter is None:  # created lazily so it binds to the running loop
+        _chat_limiter = CapacityLimiter(CHAT_MAX_CONCURRENCY)
+    return await to_thread.run_sync(fn, *args, limiter=_chat_limiter)
+
+async def save_session(sid: str) -> None:
+    """SESSIONS.save off the loop; shielded so a client disconnect doesn't skip it."""
+    with CancelScope(shield=True):
+        await to_thread.run_sync(SESSIONS.save, sid)
+
+async def sweep_sessions():
+    """Periodically expire idle sessions so their datasets and chart state are released."""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_SECONDS)
+        removed = await to_thread.run_sync(SESSIONS.sweep)
+        # cached(), not `in`: the disk store's __contains__ would reload every session from SQLite
+        for sid in [s for s, lock in SESSION_LOCKS.items() if not SESSIONS.cached(s) and not lock.locked()]:
+            SESSION_LOCKS.pop(sid, None)
+        if removed:
+            print(f"Expired {removed} idle session(s); {len(SESSIONS)} live")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    FRAMES.remove_stale_spill_dirs()
+    sweeper = asyncio.create_task(sweep_sessions())
+    yield
+    sweeper.cancel()
+    FRAMES.remove_spill_dir()
+
+app = FastAPI(title="Conversational Data Explorer (Agno + Gemini + Plotly)", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +109,10 @@ app.mount("/plots", StaticFiles(directory=STATIC_PLOTS_DIR), name="plots")
 class ChatIn(BaseModel):
     session_id: Optional[str] = None
     message: str
+    # False skips cached answers and replayed plans (the fresh answer still refreshes both)
+    use_cache: bool = True
+    # True adds per-phase timings (router, tools, model calls with token counts) to ChatOut.debug
+    debug: bool = False
 
 class ChatOut(BaseModel):
     session_id: str
@@ -56,66 +121,139 @@ class ChatOut(BaseModel):
     chart_data: Optional[Dict[str, Any]] = None
     clarifying_question: Optional[str] = None
     error: Optional[str] = None
+    debug: Optional[Dict[str, Any]] = None
+
+def as_columns(records: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Records -> column-oriented dict, the shape the UI feeds to pd.DataFrame."""
+    cols: Dict[str, List[Any]] = {}
+    for row in records:
+        for k in row:
+            cols.setdefault(k, [])
+    for row in records:
+        for k in cols:
+            cols[k].append(row.get(k))
+    return cols
 
 @app.get("/health")
 async def health():
     return {"ok": True}
 
+@app.get("/stats")
+async def stats():
+    return await to_thread.run_sync(_stats)
+
+def _stats() -> Dict[str, Any]:
+    return {"sessions": SESSIONS.stats(), "datasets": FRAMES.stats(), "results": result_cache.totals(), "answers": ANSWERS.stats(), "plans": PLANS.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request/phase latency histograms and token counters."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/upload")
 async def upload(file: UploadFile = File(...), session_id: Optional[str] = Form(None), name: Optional[str] = Form("dataset")):
-    sid = ensure_session(session_id)
-    data = await file.read()
-    
-    # Call the function directly without going through the @tool decorator
-    from app.agent.tools import get_or_create_session
-    import io
-    import pandas as pd
-    from app.services.utils import snake_case, infer_schema
-    
-    mem = get_or_create_session(sid)
+    sid = await ensure_session(session_id)
+    with span("request", "/upload"):
+        async with session_lock(sid):
+            res = await to_thread.run_sync(_load_upload, sid, file.file, name)
+            await save_session(sid)
 
-    # Try CSV
-    try:
-        buf = io.BytesIO(data)
-        buf.seek(0)
-        df = pd.read_csv(buf)
-    except Exception:
-        # Fallback to Excel
-        buf = io.BytesIO(data)
-        buf.seek(0)
-        df = pd.read_excel(buf, sheet_name=0)
-
-    # Normalize headers
-    df.columns = [snake_case(c) for c in df.columns]
-
-    # Opportunistic typing: dates & numerics (safe, non-destructive)
-    for c in df.columns:
-        # date-like
-        if any(tok in c for tok in ["date", "time", "timestamp"]):
-            try:
-                df[c] = pd.to_datetime(df[c], errors="ignore")
-            except Exception:
-                pass
-        # numeric coercion for string/object columns
-        if df[c].dtype == object:
-            try:
-                coerced = pd.to_numeric(df[c], errors="coerce")
-                if coerced.notna().sum() > max(10, int(0.5 * len(df))):
-                    df[c] = coerced
-            except Exception:
-                pass
-
-    mem.registry.put(name, df)
-    schema = infer_schema(df)
-    res = {"session_id": sid, "name": name, "rows": len(df), "cols": list(df.columns), "schema": schema}
-    
     if "error" in res:
         raise HTTPException(status_code=400, detail=res["error"])
     return res
 
+def _load_upload(sid: str, src: BinaryIO, name: str) -> Dict[str, Any]:
+    # Spool to disk in chunks and parse from the file, so the raw bytes are never held in memory.
+    # The content hash lets identical uploads (from any session) share one parsed frame.
+    path, digest = spool_to_disk(src)
+    try:
+        key, df, memory = load_upload(path, digest)
+    finally:
+        os.remove(path)
+
+    mem = get_or_create_session(sid)
+    mem.registry.put(name, df, key=key)
+    memory = mem.registry.cached("memory", lambda _df: memory)
+    # Computed once per upload; reused by tool_smart_explore and the agent's prompt context
+    schema = session_explore(mem)["schema"]
+    build_indexes(mem)
+    return {"session_id": sid, "name": name, "rows": len(df), "cols": list(df.columns), "schema": schema, "memory": memory}
+
 @app.post("/chat", response_model=ChatOut)
 async def chat(body: ChatIn):
-    sid = ensure_session(body.session_id)
+    sid = await ensure_session(body.session_id)
+    trace = start_trace()
+    with span("request", "/chat"):
+        async with session_lock(sid):
+            try:
+                out = await run_in_chat_pool(_chat_sync, sid, body)
+            finally:
+                await save_session(sid)
+        if body.debug:
+            out.debug = trace.summary()
+        # Serialized here rather than by FastAPI so the cost shows up as its own span
+        with span("serialize"):
+            content = out.model_dump_json()
+    return Response(content=content, media_type="application/json")
+
+def _chat_sync(sid: str, body: ChatIn) -> ChatOut:
+    early = _prepare_turn(sid, body.message)
+    if early:
+        return early
+    fingerprint, schema = _fingerprints(sid)
+    cached = _cached_answer(sid, body, fingerprint, schema)
+    if cached:
+        return cached
+    with span("agent"):
+        agent_result = build_agent().run(_agent_message(sid, body.message))
+    record_llm_metrics(agent_result.metrics)
+    out = _finish_turn(sid, body.message, agent_result.content)
+    _store_answer(body, fingerprint, out)
+    _record_plan(body, schema, [_tool_call(t) for t in agent_result.tools or []])
+    return out
+
+def _fingerprints(sid: str) -> Tuple[Optional[str], Optional[str]]:
+    """(dataset, schema) identities the answer and plan caches are keyed on; Nones when
+    there's nothing loaded."""
+    if not ANSWERS.enabled and not PLANS.enabled:
+        return None, None
+    registry = SESSIONS[sid].registry
+    try:
+        key, columns = registry.fingerprint(), registry.profile().columns
+    except ValueError:
+        return None, None
+    return dataset_fingerprint(key, columns), schema_fingerprint(columns)
+
+def _cached_answer(sid: str, body: ChatIn, fingerprint: Optional[str], schema: Optional[str]) -> Optional[ChatOut]:
+    """A stored answer for this exact data, else the recorded tool plan for this schema
+    replayed against the current data with a templated reply (no model call either way)."""
+    if not fingerprint or not body.use_cache:
+        return None
+    hit = ANSWERS.get(body.message, fingerprint)
+    if hit:
+        return ChatOut(**{**hit, "session_id": sid})
+    steps = PLANS.get(body.message, schema)
+    answer = replay_plan(sid, steps) if steps else None
+    if not answer:
+        return None
+    out = _planned_reply(sid, answer)
+    _store_answer(body, fingerprint, out)
+    return out
+
+def _tool_call(execution) -> Dict[str, Any]:
+    return {"tool": execution.tool_name, "args": execution.tool_args, "error": execution.tool_call_error}
+
+def _record_plan(body: ChatIn, schema: Optional[str], calls: List[Dict[str, Any]]) -> None:
+    steps = recordable_plan(calls) if schema else None
+    if steps:
+        PLANS.put(body.message, schema, steps)
+
+def _store_answer(body: ChatIn, fingerprint: Optional[str], out: ChatOut) -> None:
+    if fingerprint and out.reply and not out.error and not out.clarifying_question:
+        ANSWERS.put(body.message, fingerprint, out.model_dump(exclude={"session_id"}))
+
+def _prepare_turn(sid: str, message: str) -> Optional[ChatOut]:
+    """Answer without the agent when possible (fast path or clarifying question)."""
     print(f"Chat session ID: {sid}")
     print(f"Available sessions: {list(SESSIONS.keys())}")
     
@@ -124,9 +262,23 @@ async def chat(body: ChatIn):
         print(f"Session {sid} registry tables: {list(SESSIONS[sid].registry.tables.keys())}")
         print(f"Session {sid} active: {SESSIONS[sid].registry.active}")
 
-    # Example clarification: user asks for a "trend"/"plot" without a known date column
-    intent = detect_intent(body.message)
     mem = SESSIONS[sid]
+    mem.tool_results.clear()
+
+    # Fast path: unambiguous top-k/plot/describe questions are answered without the LLM
+    with span("router"):
+        intent = detect_intent(message)
+        try:
+            df = mem.registry.get()
+        except ValueError:
+            df = None
+        plan = plan_message(message, df, intent) if df is not None else None
+    if plan:
+        answer = execute_plan(sid, plan)
+        if answer:
+            return _planned_reply(sid, answer)
+
+    # Example clarification: user asks for a "trend"/"plot" without a known date column
     if intent == "PLOT":
         # If they reference "trend" but no obvious datetime column is saved, we can suggest options
         try:
@@ -138,15 +290,31 @@ async def chat(body: ChatIn):
                 return ChatOut(session_id=sid, reply=q, clarifying_question=q)
         except Exception:
             pass
+    return None
+
+def _planned_reply(sid: str, answer: Dict[str, Any]) -> ChatOut:
+    """ChatOut for a reply produced by running tools directly (planner or plan replay)."""
+    mem = SESSIONS[sid]
+    chart_data = mem.recall("last_chart")
+    if chart_data:
+        mem.remember("last_chart", None)
+    tables = [as_columns(t) for t in answer["tables"]] or None
+    return ChatOut(session_id=sid, reply=answer["reply"], chart_data=chart_data, tables=tables)
 
+def _agent_message(sid: str, message: str) -> str:
     # Delegate to agent (it will choose tools using function-calling)
-    # Add session context to the message
-    message_with_context = f"[SESSION_ID: {sid}] {body.message}"
-    agent_result = agent.run(message_with_context)
-    reply = agent_result.content
+    # Add session context and the cached dataset summary to the message
+    try:
+        context = explore_context(session_explore(SESSIONS[sid]))
+    except ValueError:
+        return f"[SESSION_ID: {sid}] {message}"
+    return f"[SESSION_ID: {sid}]\n{context}\n{message}"
+
+def _finish_turn(sid: str, message: str, reply: str) -> ChatOut:
+    mem = SESSIONS[sid]
 
     # Simple heuristic: remember date column if user says "use <something_date>"
-    low = body.message.lower()
+    low = message.lower()
     if "use " in low and "date" in low:
         for token in re.split(r"[^a-z0-9_]+", low):
             if "date" in token:
@@ -157,17 +325,97 @@ async def chat(body: ChatIn):
     if chart_data:
         mem.remember("last_chart", None)  # Clear it after use
     
-    # Extract any tables from agent response (for tool_top_k, tool_describe, etc.)
-    tables = None
-    # This is a simple approach - you might want to enhance this based on your needs
+    # Tables come straight from the full tool results captured during the run, not the reply text
+    tables = [as_columns(t) for t in result_tables(mem.tool_results)] or None
+    mem.tool_results.clear()
 
     return ChatOut(session_id=sid, reply=reply, chart_data=chart_data, tables=tables)
 
+@app.post("/chat/stream")
+async def chat_stream(body: ChatIn):
+    """Server-Sent Events version of /chat: tool progress and tokens as they arrive, then a final `done` event."""
+    sid = await ensure_session(body.session_id)
+    return StreamingResponse(_sse(sid, body), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def _sse(sid: str, body: ChatIn):
+    trace = start_trace()
+    with span("request", "/chat/stream"):
+        async for event in _sse_events(sid, body, trace):
+            yield event
+
+async def _sse_events(sid: str, body: ChatIn, trace: Trace):
+    async with session_lock(sid):
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def produce():
+            try:
+                for event in _chat_events(sid, body):
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, {"event": "error", "session_id": sid, "error": str(e)})
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        worker = asyncio.ensure_future(run_in_chat_pool(produce))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                if event["event"] == "done" and body.debug:
+                    event["debug"] = trace.summary()
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        finally:
+            # A client disconnect cancels this generator mid-stream, but the worker keeps
+            # running on the session: hold the session lock until it's done, then save
+            with CancelScope(shield=True):
+                await worker
+            await save_session(sid)
+
+def _chat_events(sid: str, body: ChatIn):
+    """Blocking generator of stream events; runs in the chat worker pool."""
+    yield {"event": "start", "session_id": sid}
+    early = _prepare_turn(sid, body.message)
+    if early:
+        yield {"event": "done", **early.model_dump()}
+        return
+    fingerprint, schema = _fingerprints(sid)
+    cached = _cached_answer(sid, body, fingerprint, schema)
+    if cached:
+        yield {"event": "done", **cached.model_dump()}
+        return
+
+    parts: List[str] = []
+    calls: List[Dict[str, Any]] = []
+    agent = build_agent()
+    stream = agent.run(_agent_message(sid, body.message), stream=True, stream_intermediate_steps=True)
+    for chunk in stream:
+        if chunk.event == RunEvent.tool_call_started.value and chunk.tools:
+            call = chunk.tools[-1]
+            yield {"event": "tool_start", "tool": call.tool_name, "args": call.tool_args}
+        elif chunk.event == RunEvent.tool_call_completed.value and chunk.tools:
+            call = chunk.tools[-1]
+            calls.append(_tool_call(call))
+            yield {"event": "tool_end", "tool": call.tool_name, "error": bool(call.tool_call_error)}
+        elif chunk.event == RunEvent.run_response.value and isinstance(chunk.content, str) and chunk.content:
+            parts.append(chunk.content)
+            yield {"event": "token", "text": chunk.content}
+
+    record_llm_metrics(agent.run_response.metrics if agent.run_response else None)
+    out = _finish_turn(sid, body.message, "".join(parts))
+    _store_answer(body, fingerprint, out)
+    _record_plan(body, schema, calls)
+    yield {"event": "done", **out.model_dump()}
+
 class ResetIn(BaseModel):
     session_id: Optional[str] = None
 
 @app.post("/reset")
 async def reset(body: ResetIn):
-    sid = ensure_session(body.session_id)
-    SESSIONS[sid] = SessionMemory()
+    sid = await ensure_session(body.session_id)
+    async with session_lock(sid):
+        # The store closes (and frees) the old one, and saves the new one
+        await to_thread.run_sync(SESSIONS.__setitem__, sid, SessionMemory())
     return {"session_id": sid, "status": "reset"}
\ No newline at end of file
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# How long a cached answer stays valid (0 disables the cache)
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", os.path.join("data", "answers.sqlite3"))
+# How long a recorded tool plan can be replayed (0 disables plan replay); stored in the same file
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", "604800"))
+
+_punct = re.compile(r"[^\w\s%.-]+")
+_space = re.compile(r"\s+")
+
+def normalize_question(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    text = _punct.sub(" ", text.lower())
+    return _space.sub(" ", text).strip(" .")
+
+def schema_fingerprint(columns: Dict[str, Dict[str, Any]]) -> str:
+    """Hash of a dataset's column names and dtypes (profile columns)."""
+    schema = json.dumps([[c, p["dtype"]] for c, p in columns.items()])
+    return hashlib.sha1(schema.encode()).hexdigest()
+
+def dataset_fingerprint(data_key: str, columns: Dict[str, Dict[str, Any]]) -> str:
+    """Identity of a dataset version: its store key plus its schema fingerprint."""
+    return f"{data_key}|{schema_fingerprint(columns)}"
+
+class _SqliteCache:
+    """JSON values in an SQLite table keyed by (normalized question, fingerprint), with a TTL.
+    Stored on disk so entries survive restarts and are shared by workers."""
+
+    TABLE = ""
+
+    def __init__(self, path: Optional[str], ttl: float):
+        self.path = path or ANSWER_CACHE_PATH
+        self.ttl = ttl
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _conn(self) -> sqlite3.Connection:
+        # Opened on first use so a disabled cache never touches the disk
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+                " key TEXT PRIMARY KEY, question TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    @staticmethod
+    def _key(question: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{normalize_question(question)}\n{fingerprint}".encode()).hexdigest()
+
+    def get(self, question: str, fingerprint: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._conn().execute(
+                f"SELECT response, created FROM {self.TABLE} WHERE key = ?", (self._key(question, fingerprint),)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, question: str, fingerprint: str, response: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} (key, question, response, created) VALUES (?, ?, ?, ?)",
+                (self._key(question, fingerprint), normalize_question(question),
+                 json.dumps(response, default=str), time.time()),
+            )
+            db.execute(f"DELETE FROM {self.TABLE} WHERE created < ?", (time.time() - self.ttl,))
+            db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+class AnswerCache(_SqliteCache):
+    """Replies (with chart_data and tables) to previous questions. Keyed by the dataset
+    fingerprint, so any change to the data or its schema misses."""
+
+    TABLE = "answers"
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        super().__init__(path, ANSWER_CACHE_TTL_SECONDS if ttl is None else ttl)
+
+class PlanCache(_SqliteCache):
+    """Tool-call sequences the agent chose for previous questions. Keyed by the schema
+    fingerprint only: the same plan can be replayed after the rows change."""
+
+    TABLE = "plans"
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        super().__init__(path, PLAN_CACHE_TTL_SECONDS if ttl is None else ttl)
+
+ANSWERS = AnswerCache()
+PLANS = PlanCache()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+# Approximate token budget for one tool result as seen by the model (0 = send results as-is)
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "1000"))
+# Significant digits kept for floats in compacted results
+TOOL_RESULT_DIGITS = int(os.getenv("TOOL_RESULT_DIGITS", "4"))
+
+MAX_TEXT = 200
+# Row/item limits tried in turn until the result fits the budget
+_ITEM_LIMITS = (50, 20, 10, 5, 3, 1)
+
+def estimate_tokens(obj: Any) -> int:
+    """Rough token count of an object as the model sees it (~4 characters per token)."""
+    return len(json.dumps(obj, default=str, separators=(",", ":"))) // 4 + 1
+
+def _is_records(obj: Any) -> bool:
+    return isinstance(obj, list) and bool(obj) and all(isinstance(r, dict) for r in obj)
+
+def _compact(obj: Any, max_items: int, digits: int) -> Any:
+    if isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        return float(f"{obj:.{digits}g}")
+    if isinstance(obj, str):
+        return obj if len(obj) <= MAX_TEXT else obj[:MAX_TEXT] + f"... ({len(obj) - MAX_TEXT} more chars)"
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        out = {str(k): _compact(v, max_items, digits) for k, v in items[:max_items]}
+        if len(items) > max_items:
+            out["..."] = f"{len(items) - max_items} more"
+        return out
+    if _is_records(obj):
+        # Columnar: column names once instead of repeated in every row
+        columns: List[str] = []
+        for row in obj:
+            columns.extend(k for k in row if k not in columns)
+        shown = columns[:max_items]
+        table: Dict[str, Any] = {
+            "columns": shown,
+            "rows": [[_compact(row.get(c), max_items, digits) for c in shown] for row in obj[:max_items]],
+        }
+        if len(obj) > max_items:
+            table["more_rows"] = len(obj) - max_items
+        if len(columns) > max_items:
+            table["more_columns"] = len(columns) - max_items
+        return table
+    if isinstance(obj, (list, tuple)):
+        out = [_compact(v, max_items, digits) for v in obj[:max_items]]
+        if len(obj) > max_items:
+            out.append(f"... {len(obj) - max_items} more")
+        return out
+    if hasattr(obj, "item") and not isinstance(obj, (bytes, bytearray)):  # numpy scalars
+        try:
+            return _compact(obj.item(), max_items, digits)
+        except (TypeError, ValueError):
+            pass
+    return obj
+
+def compact_result(result: Any, budget: Optional[int] = None, digits: Optional[int] = None) -> Any:
+    """Shrink a tool result for the model's context: records become columnar tables, floats are
+    rounded, and long lists/tables/text are truncated with "N more" markers, tightening the
+    limits until the estimate fits `budget` tokens.
+
+    Results already within budget are returned unchanged, so the model sees the same
+    numbers as the tables shown to the user."""
+    budget = TOOL_RESULT_TOKEN_BUDGET if budget is None else budget
+    digits = digits or TOOL_RESULT_DIGITS
+    if budget <= 0 or estimate_tokens(result) <= budget:
+        return result
+    out = result
+    for max_items in _ITEM_LIMITS:
+        out = _compact(result, max_items, digits)
+        if estimate_tokens(out) <= budget:
+            break
+    return out
@@ -1,18 +1,66 @@
 from __future__ import annotations
-from typing import Dict, Optional
+import uuid
+from typing import Any, Callable, Dict, Optional
 import pandas as pd
+from app.services.frame_store import FRAMES, FrameStore
+from app.services.profile import DatasetProfile
 
 class DataRegistry:
-    def __init__(self):
-        self.tables: Dict[str, pd.DataFrame] = {}
+    def __init__(self, store: Optional[FrameStore] = None):
+        self.store = store or FRAMES
+        # name -> FrameStore key; frames themselves are shared through the store
+        self.tables: Dict[str, str] = {}
         self.active: Optional[str] = None
 
-    def put(self, name: str, df: pd.DataFrame):
-        self.tables[name] = df
+    def put(self, name: str, df: pd.DataFrame, key: Optional[str] = None):
+        """Register a table. `key` identifies its content (e.g. an upload hash) so identical
+        data is shared across sessions; without one the frame is private to this registry."""
+        key = key or f"local:{uuid.uuid4().hex}"
+        self.store.acquire(key, df)
+        self._bind(name, key)
+
+    def attach(self, name: str, key: str):
+        """Register a table the store already knows (in memory or persisted) by its key."""
+        self.store.acquire(key)
+        self._bind(name, key)
+
+    def _bind(self, name: str, key: str):
+        old = self.tables.get(name)
+        self.tables[name] = key
+        if old is not None:
+            self.store.release(old)
         self.active = name
 
     def get(self, name: Optional[str] = None) -> pd.DataFrame:
         key = name or self.active
         if not key or key not in self.tables:
             raise ValueError("No active dataset. Upload a CSV first.")
-        return self.tables[key]
\ No newline at end of file
+        return self.store.get(self.tables[key])
+
+    def fingerprint(self, name: Optional[str] = None) -> str:
+        """Store key of a table; changes whenever the table's content is replaced."""
+        table = name or self.active
+        self.get(table)
+        return self.tables[table]
+
+    def clear(self) -> int:
+        """Release every table held by this registry; returns the resident bytes reclaimed."""
+        freed = sum(self.store.release(key) for key in self.tables.values())
+        self.tables.clear()
+        self.active = None
+        return freed
+
+    def cached(self, key: str, build: Callable[[pd.DataFrame], Any], name: Optional[str] = None) -> Any:
+        """Return `build(df)` for a table, computing it once per table content.
+
+        Results are stored with the frame, so sessions sharing a frame share them too."""
+        table = name or self.active
+        df = self.get(table)
+        derived = self.store.derived(self.tables[table])
+        if key not in derived:
+            derived[key] = build(df)
+        return derived[key]
+
+    def profile(self, name: Optional[str] = None) -> DatasetProfile:
+        """Column profile of a table, built once per table content."""
+        return self.cached("profile", DatasetProfile, name)
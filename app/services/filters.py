@@ -0,0 +1,389 @@
+from __future__ import annotations
+import operator
+import re
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from app.services.indexes import CategoryIndex, DatasetIndexes, Index, TimeIndex, unpack
+from app.services.utils import as_datetime64, resolve_column
+
+# Rows evaluated per step when a preview may stop early
+PREVIEW_CHUNK_ROWS = 65536
+
+class FilterError(ValueError):
+    """A filter expression that can't be parsed or doesn't fit the data."""
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+      (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<num>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+    | (?P<col>`[^`]+`)
+    | (?P<op>==|!=|<=|>=|=|<|>|&&?|\|\|?|~|\(|\)|\[|\]|,)
+    | (?P<word>[A-Za-z_]\w*)
+    )""", re.VERBOSE)
+_KEYWORDS = {"and", "or", "not", "in", "between", "contains", "startswith", "endswith", "true", "false"}
+_COMPARE = {"==": operator.eq, "=": operator.eq, "!=": operator.ne,
+            "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+_FLIP = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "==": "==", "=": "==", "!=": "!="}
+
+Lookup = Optional[Callable[[str], Optional[Index]]]
+# A mask is a boolean row array, or a packed bitmap (uint8) when it came from an index
+Mask = Callable[[pd.DataFrame, Lookup], np.ndarray]
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise FilterError(f"unexpected character {text[pos:].lstrip()[:1]!r} at position {pos}")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "str":
+            tokens.append(("lit", re.sub(r"\\(.)", r"\1", value[1:-1])))
+        elif kind == "num":
+            tokens.append(("lit", float(value) if any(c in value for c in ".eE") else int(value)))
+        elif kind == "col":
+            tokens.append(("col", value[1:-1]))
+        elif kind == "word" and value.lower() in _KEYWORDS:
+            word = value.lower()
+            tokens.append(("lit", word == "true") if word in ("true", "false") else ("kw", word))
+        elif kind == "word":
+            tokens.append(("col", value))
+        else:
+            tokens.append(("op", {"&&": "&", "||": "|", "|": "|", "&": "&"}.get(value, value)))
+    return tokens
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    resolved = resolve_column(df, name)
+    if not resolved:
+        raise FilterError(f"unknown column '{name}'")
+    return df[resolved]
+
+def _tz(s: pd.Series) -> Any:
+    # Arrow date columns have no .dt.tz; read it from the type instead
+    if isinstance(s.dtype, pd.ArrowDtype):
+        return getattr(s.dtype.pyarrow_dtype, "tz", None)
+    return s.dt.tz
+
+def _coerce(s: pd.Series, value: Any) -> Any:
+    """Literal converted to the column's domain (dates for datetime columns, numbers for numeric)."""
+    if isinstance(value, str):
+        if pd.api.types.is_datetime64_any_dtype(s):
+            try:
+                ts = pd.Timestamp(value)
+            except ValueError:
+                raise FilterError(f"'{value}' is not a date")
+            tz = _tz(s)
+            return ts.tz_localize(tz) if tz is not None and ts.tz is None else ts
+        if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            try:
+                return float(value)
+            except ValueError:
+                raise FilterError(f"column '{s.name}' is numeric; '{value}' is not a number")
+    return value
+
+def _bool(result: Any) -> np.ndarray:
+    if isinstance(result, pd.Series):
+        return result.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(result, dtype=bool)
+
+def _category_mask(s: pd.Series, category_mask: np.ndarray) -> np.ndarray:
+    """Evaluate a predicate once per category and broadcast it through the codes."""
+    codes = s.cat.codes.to_numpy()
+    lookup = np.append(category_mask, False)  # code -1 (missing) -> last slot -> False
+    return lookup[codes]
+
+def _indexed(s: pd.Series, ix: Lookup, kind: type) -> Optional[Index]:
+    index = ix(s.name) if ix is not None else None
+    return index if isinstance(index, kind) else None
+
+def _time_range(s: pd.Series, ix: Lookup, low: Any, high: Any, low_closed: bool = True,
+                high_closed: bool = True) -> Optional[np.ndarray]:
+    """Range mask from a time index (binary search instead of a scan), or None without one."""
+    index = _indexed(s, ix, TimeIndex)
+    if index is None or not all(v is None or isinstance(v, (str, pd.Timestamp)) for v in (low, high)):
+        return None
+    window = index.window(*(None if v is None else _coerce(s, v) for v in (low, high)), low_closed, high_closed)
+    return None if window is None else index.mask(*window)
+
+def _and(a: np.ndarray, b: np.ndarray, rows: int) -> np.ndarray:
+    if a.dtype == b.dtype:
+        return a & b  # two bitmaps intersect on packed bytes
+    return _rows(a, rows) & _rows(b, rows)
+
+def _or(a: np.ndarray, b: np.ndarray, rows: int) -> np.ndarray:
+    if a.dtype == b.dtype:
+        return a | b
+    return _rows(a, rows) | _rows(b, rows)
+
+def _rows(m: np.ndarray, rows: int) -> np.ndarray:
+    """Boolean row mask from either mask representation."""
+    return unpack(m, rows) if m.dtype == np.uint8 else m
+
+def _compare(s: pd.Series, op: str, value: Any, ix: Lookup = None) -> np.ndarray:
+    if op in ("==", "=", "!="):
+        index = _indexed(s, ix, CategoryIndex)
+        if index is not None:
+            bits = index.bits([value])
+            return ~bits if op == "!=" else bits
+    else:
+        bound = {"<": (None, value, True, False), "<=": (None, value, True, True),
+                 ">": (value, None, False, True), ">=": (value, None, True, True)}[op]
+        mask = _time_range(s, ix, *bound)
+        if mask is not None:
+            return mask
+    if isinstance(s.dtype, pd.CategoricalDtype) and op in ("==", "=", "!="):
+        cats = s.cat.categories
+        hit = np.asarray(cats == value) if len(cats) else np.zeros(0, dtype=bool)
+        mask = _category_mask(s, hit)
+        return ~mask if op == "!=" else mask
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(s.cat.categories.dtype)
+    s = as_datetime64(s)  # Arrow dates don't compare with Timestamps
+    value = _coerce(s, value)
+    try:
+        if op == "!=":
+            # Missing values are "not equal" (as in pandas); Arrow columns would return NA for them
+            return ~_bool(s == value)
+        return _bool(_COMPARE[op](s, value))
+    except TypeError:
+        raise FilterError(f"can't compare column '{s.name}' ({s.dtype}) with {value!r}")
+
+def _compare_columns(a: pd.Series, op: str, b: pd.Series) -> np.ndarray:
+    a, b = as_datetime64(a), as_datetime64(b)
+    if op == "!=":
+        return ~_bool(a == b)
+    return _bool(_COMPARE[op](a, b))
+
+def _between(s: pd.Series, low: Any, high: Any, ix: Lookup = None, low_closed: bool = True,
+             high_closed: bool = True) -> np.ndarray:
+    mask = _time_range(s, ix, low, high, low_closed, high_closed)
+    if mask is not None:
+        return mask
+    return _compare(s, ">=" if low_closed else ">", low) & _compare(s, "<=" if high_closed else "<", high)
+
+def _isin(s: pd.Series, values: List[Any], ix: Lookup = None) -> np.ndarray:
+    index = _indexed(s, ix, CategoryIndex)
+    if index is not None:
+        return index.bits(values)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return _category_mask(s, np.asarray(s.cat.categories.isin(values)))
+    s = as_datetime64(s)
+    return _bool(s.isin([_coerce(s, v) for v in values]))
+
+def _text(s: pd.Series, method: str, value: Any) -> np.ndarray:
+    if not isinstance(value, str):
+        raise FilterError(f"'{method}' needs a quoted string")
+    value = value.lower()
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cats = pd.Series(s.cat.categories.astype(str)).str.lower()
+        return _category_mask(s, _bool(_text_match(cats, method, value)))
+    strings = s if pd.api.types.is_string_dtype(s) else s.astype(str)
+    return _bool(_text_match(strings.str.lower(), method, value))
+
+def _text_match(lowered: pd.Series, method: str, value: str) -> pd.Series:
+    if method == "contains":
+        return lowered.str.contains(value, regex=False, na=False)
+    return getattr(lowered.str, method)(value, na=False)
+
+class _Parser:
+    """Recursive descent: or -> and -> not -> predicate, with parentheses."""
+
+    def __init__(self, tokens: List[Tuple[str, Any]]):
+        self.tokens = tokens
+        self.i = 0
+        self.columns: List[str] = []
+
+    def peek(self, offset: int = 0) -> Optional[Tuple[str, Any]]:
+        j = self.i + offset
+        return self.tokens[j] if j < len(self.tokens) else None
+
+    def take(self, kind: Optional[str] = None, value: Any = None) -> Tuple[str, Any]:
+        tok = self.peek()
+        if tok is None or (kind and tok[0] != kind) or (value is not None and tok[1] != value):
+            want = value or kind or "more input"
+            got = tok[1] if tok else "end of filter"
+            raise FilterError(f"expected {want!r}, found {got!r}")
+        self.i += 1
+        return tok
+
+    def accept(self, kind: str, value: Any) -> bool:
+        tok = self.peek()
+        if tok and tok[0] == kind and tok[1] == value:
+            self.i += 1
+            return True
+        return False
+
+    def parse(self) -> Mask:
+        if not self.tokens:
+            raise FilterError("empty filter")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise FilterError(f"unexpected {self.peek()[1]!r}")
+        return node
+
+    def parse_or(self) -> Mask:
+        node = self.parse_and()
+        while self.accept("kw", "or") or self.accept("op", "|"):
+            left, right = node, self.parse_and()
+            node = lambda df, ix, a=left, b=right: _or(a(df, ix), b(df, ix), len(df))  # noqa: E731
+        return node
+
+    def parse_and(self) -> Mask:
+        node = self.parse_not()
+        while self.accept("kw", "and") or self.accept("op", "&"):
+            left, right = node, self.parse_not()
+            node = lambda df, ix, a=left, b=right: _and(a(df, ix), b(df, ix), len(df))  # noqa: E731
+        return node
+
+    def parse_not(self) -> Mask:
+        if self.accept("kw", "not") or self.accept("op", "~"):
+            inner = self.parse_not()
+            return lambda df, ix: ~inner(df, ix)
+        if self.accept("op", "("):
+            node = self.parse_or()
+            self.take("op", ")")
+            return node
+        return self.parse_predicate()
+
+    def operand(self) -> Tuple[str, Any]:
+        tok = self.take()
+        if tok[0] not in ("col", "lit"):
+            raise FilterError(f"expected a column or value, found {tok[1]!r}")
+        if tok[0] == "col" and tok[1] not in self.columns:
+            self.columns.append(tok[1])
+        return tok
+
+    def literal_list(self) -> List[Any]:
+        close = {"[": "]", "(": ")"}[self.take("op")[1]] if self.peek() and self.peek()[1] in ("[", "(") else None
+        if close is None:
+            raise FilterError("expected a list like ['a', 'b'] after 'in'")
+        values = []
+        while not self.accept("op", close):
+            values.append(self.take("lit")[1])
+            if not self.accept("op", ","):
+                self.take("op", close)
+                break
+        return values
+
+    def parse_predicate(self) -> Mask:
+        first = self.operand()
+        tok = self.peek()
+        if tok is None:
+            raise FilterError("incomplete condition")
+        negate = False
+        if tok == ("kw", "not") and self.peek(1) == ("kw", "in"):
+            self.i += 1
+            negate = True
+            tok = self.peek()
+        if tok[0] == "kw" and tok[1] in ("in", "between", "contains", "startswith", "endswith"):
+            self.i += 1
+            if first[0] != "col":
+                raise FilterError(f"'{tok[1]}' needs a column on the left")
+            name = first[1]
+            if tok[1] == "in":
+                values = self.literal_list()
+                node = lambda df, ix: _isin(_column(df, name), values, ix)  # noqa: E731
+                return (lambda df, ix: ~node(df, ix)) if negate else node
+            if tok[1] == "between":
+                low = self.take("lit")[1]
+                self.take("kw", "and")
+                high = self.take("lit")[1]
+                return lambda df, ix: _between(_column(df, name), low, high, ix)
+            method, value = tok[1], self.take("lit")[1]
+            return lambda df, ix: _text(_column(df, name), method, value)
+
+        # Comparison, possibly chained as a range: 10 <= price < 20
+        parts: List[Mask] = []
+        chain = [first]
+        left = first
+        while self.peek() and self.peek()[0] == "op" and self.peek()[1] in _COMPARE:
+            op = self.take()[1]
+            right = self.operand()
+            parts.append(self._comparison(left, op, right))
+            chain += [op, right]
+            left = right
+        if not parts:
+            raise FilterError(f"expected a comparison after {first[1]!r}")
+        kinds = [tok[0] for tok in chain[::2]]
+        if kinds == ["lit", "col", "lit"] and chain[1] in ("<", "<=") and chain[3] in ("<", "<="):
+            # low < col < high: a single range, so a time index answers it with one binary search
+            (_, low), op1, (_, name), op2, (_, high) = chain
+            return lambda df, ix: _between(_column(df, name), low, high, ix, op1 == "<=", op2 == "<=")
+        node = parts[0]
+        for part in parts[1:]:
+            node = lambda df, ix, a=node, b=part: _and(a(df, ix), b(df, ix), len(df))  # noqa: E731
+        return node
+
+    @staticmethod
+    def _comparison(left: Tuple[str, Any], op: str, right: Tuple[str, Any]) -> Mask:
+        if left[0] == "lit" and right[0] == "col":
+            left, right, op = right, left, _FLIP[op]
+        if left[0] == "col" and right[0] == "lit":
+            name, value = left[1], right[1]
+            return lambda df, ix: _compare(_column(df, name), op, value, ix)
+        if left[0] == "col" and right[0] == "col":
+            a, b = left[1], right[1]
+            return lambda df, ix: _compare_columns(_column(df, a), op, _column(df, b))
+        raise FilterError("a comparison needs at least one column")
+
+class FilterPlan:
+    """A parsed filter, evaluated as vectorized boolean masks (no per-call parsing, no eval)."""
+
+    def __init__(self, text: str):
+        self.text = text
+        parser = _Parser(_tokenize(text))
+        self._mask = parser.parse()
+        self.columns = parser.columns
+
+    def mask(self, df: pd.DataFrame, indexes: Optional[DatasetIndexes] = None) -> np.ndarray:
+        """Boolean row mask. With `indexes` (built for this frame), equality and IN
+        predicates on indexed columns become bitmap unions/intersections."""
+        try:
+            return _rows(self._mask(df, indexes.lookup(df) if indexes is not None else None), len(df))
+        except FilterError:
+            raise
+        except (TypeError, ValueError, NotImplementedError) as e:
+            # Anything else the data rejects (e.g. incomparable column types) is a bad filter too
+            raise FilterError(str(e)) from e
+
+    def count(self, df: pd.DataFrame, indexes: Optional[DatasetIndexes] = None) -> int:
+        """Number of matching rows, without materializing them."""
+        return int(np.count_nonzero(self.mask(df, indexes)))
+
+    def positions(self, df: pd.DataFrame, limit: Optional[int] = None,
+                  indexes: Optional[DatasetIndexes] = None) -> np.ndarray:
+        """Row positions that match. With `limit`, scans in chunks and stops once enough matched
+        (indexes cover whole frames, so they are only used for a full scan)."""
+        if limit is None or len(df) <= PREVIEW_CHUNK_ROWS:
+            found = np.flatnonzero(self.mask(df, indexes))
+            return found if limit is None else found[:limit]
+        found: List[np.ndarray] = []
+        total = 0
+        for start in range(0, len(df), PREVIEW_CHUNK_ROWS):
+            hits = np.flatnonzero(self.mask(df.iloc[start:start + PREVIEW_CHUNK_ROWS])) + start
+            found.append(hits)
+            total += len(hits)
+            if total >= limit:
+                break
+        return np.concatenate(found)[:limit] if found else np.empty(0, dtype=np.intp)
+
+    def preview(self, df: pd.DataFrame, limit: int) -> pd.DataFrame:
+        """First `limit` matching rows, stopping the scan early."""
+        return df.iloc[self.positions(df, limit)]
+
+@lru_cache(maxsize=256)
+def compile_filter(text: str) -> FilterPlan:
+    """Parse a filter once; repeated expressions reuse the compiled plan.
+
+    Syntax: comparisons (==, !=, <, <=, >, >=, chained ranges like 10 <= x < 20),
+    `col in ['a', 'b']` / `not in`, `col between 1 and 5`, and case-insensitive
+    `col contains 'x'` / `startswith` / `endswith`, combined with and/or/not (or & | ~)
+    and parentheses. Column names with spaces go in backticks."""
+    return FilterPlan(text.strip())
@@ -0,0 +1,316 @@
+from __future__ import annotations
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+
+try:  # optional: Feather (Arrow IPC) spill files, memory-mapped on load; pickle otherwise
+    import pyarrow.feather as feather
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Process-wide cap on resident frame bytes (0 = unlimited); least-recently-used frames spill to disk
+DATA_MEMORY_BUDGET_MB = float(os.getenv("DATA_MEMORY_BUDGET_MB", "0"))
+DATA_SPILL_DIR = os.getenv("DATA_SPILL_DIR") or os.path.join(tempfile.gettempdir(), "cde-spill")
+
+class FrameStore:
+    """Process-wide home for dataset frames, keyed by content.
+
+    Sessions hold references (via DataRegistry) instead of private copies, so the same
+    upload in ten sessions is parsed once and held in memory once. Frames in the store
+    are treated as immutable: replacing a table registers a new frame under a new key.
+    Artifacts derived from a frame (profile, explore summary, ...) live alongside it
+    and are shared by every session that references it.
+
+    With a memory budget, least-recently-used frames are written to a local columnar
+    file and dropped from RAM; the next get() reloads them transparently. Spill files go
+    to a directory of this process's own under spill_dir, since keys are shared across
+    workers but each process deletes its spill files when it releases them.
+
+    With a persist dir (see enable_persistence), frames are also written there durably so
+    other worker processes and later restarts can acquire them by key without the data.
+    Feather files are written uncompressed and memory-mapped on load: numeric columns are
+    views over the file, so every worker serving a dataset shares the same page cache
+    instead of holding a private copy. Mapped frames are read-only."""
+
+    def __init__(self, budget_bytes: Optional[int] = None, spill_dir: Optional[str] = None):
+        self.budget_bytes = int(DATA_MEMORY_BUDGET_MB * 2**20) if budget_bytes is None else budget_bytes
+        self.spill_root = spill_dir or DATA_SPILL_DIR
+        self.spill_dir = os.path.join(self.spill_root, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self.persist_dir: Optional[str] = None
+        self._frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()  # resident, LRU first
+        self._files: Dict[str, str] = {}  # key -> on-disk copy (frames are immutable, so it stays valid)
+        self._persisted: Dict[str, str] = {}  # key -> durable copy under persist_dir (never auto-deleted)
+        self._mapped: set = set()  # keys whose resident frame is a memory-mapped view of its file
+        self._spilling: Dict[str, pd.DataFrame] = {}  # evicted, file being written outside the lock
+        self._sizes: Dict[str, int] = {}
+        self._refs: Dict[str, int] = {}
+        self._derived: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.reloads = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._refs
+
+    def lookup(self, key: str) -> Optional[pd.DataFrame]:
+        """The stored frame for `key`, or None (e.g. to skip re-parsing a known upload)."""
+        try:
+            return self.get(key) if key in self._refs else None
+        except KeyError:
+            return None  # released meanwhile
+
+    def acquire(self, key: str, df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Take a reference to `key`, storing `df` if the key is new. Returns the stored frame,
+        which is the existing one when another session got there first."""
+        path, evicted = None, []
+        with self._lock:
+            if key in self._refs:
+                self._refs[key] += 1
+                return self.get(key)
+            if df is None:
+                # Known only on disk (written by another worker or before a restart)
+                path = self.persisted_path(key)
+                if not path:
+                    raise KeyError(key)
+        if path:
+            df = self._read(path)  # outside the lock: other tools keep reading their frames
+        with self._lock:
+            if key in self._refs:
+                self._refs[key] += 1  # another thread stored it first
+            else:
+                if path:
+                    self._files[key] = self._persisted[key] = path
+                    self._mark_mapped(key, path)
+                self._frames[key] = df
+                self._sizes[key] = int(df.memory_usage(deep=True).sum())
+                self._refs[key] = 1
+                self._derived[key] = {}
+                evicted = self._evict(keep=key)
+        self._spill_all(evicted)
+        return self.get(key)
+
+    def release(self, key: str) -> int:
+        """Drop a reference; the frame and its derived artifacts are freed with the last one.
+        Returns the resident bytes reclaimed (0 while other references remain)."""
+        with self._lock:
+            if key not in self._refs:
+                return 0
+            self._refs[key] -= 1
+            if self._refs[key] > 0:
+                return 0
+            freed = self._sizes.pop(key, 0) if self._frames.pop(key, None) is not None else 0
+            self._sizes.pop(key, None)
+            self._refs.pop(key, None)
+            self._derived.pop(key, None)
+            self._spilling.pop(key, None)
+            self._mapped.discard(key)
+            path = self._files.pop(key, None)
+            if path and path != self._persisted.pop(key, None) and os.path.exists(path):
+                os.remove(path)
+            return freed
+
+    def get(self, key: str) -> pd.DataFrame:
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+            if key in self._spilling:
+                # Evicted but its file isn't written yet: make it resident again
+                df = self._frames[key] = self._spilling[key]
+                return df
+            if key not in self._files:
+                raise KeyError(key)
+            path = self._files[key]
+        df = self._read(path)
+        with self._lock:
+            if key in self._frames:
+                return self._frames[key]  # reloaded by another thread meanwhile
+            if key not in self._refs:
+                return df  # released meanwhile; the caller still gets its data
+            self._frames[key] = df
+            self._mark_mapped(key, path)
+            self.reloads += 1
+            evicted = self._evict(keep=key)
+        self._spill_all(evicted)
+        return df
+
+    def derived(self, key: str) -> Dict[str, Any]:
+        """Mutable cache of artifacts computed from the frame stored under `key`."""
+        with self._lock:
+            return self._derived.setdefault(key, {})
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(self._sizes[k] for k in self._frames)
+
+    def _evict(self, keep: Optional[str] = None) -> List[Tuple[str, pd.DataFrame]]:
+        """Drop least-recently-used frames until the budget holds (called under the lock).
+
+        Returns the evicted frames that have no file yet; the caller writes them with
+        _spill_all() after releasing the lock. Until then get() serves them from memory."""
+        if self.budget_bytes <= 0:
+            return []
+        resident = self.resident_bytes()
+        unwritten = []
+        for key in list(self._frames):
+            if resident <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            df = self._frames.pop(key)
+            self._mapped.discard(key)
+            if key not in self._files and key not in self._spilling:
+                self._spilling[key] = df
+                unwritten.append((key, df))
+            resident -= self._sizes[key]
+            self.evictions += 1
+        return unwritten
+
+    def _spill_all(self, frames: List[Tuple[str, pd.DataFrame]]) -> None:
+        for key, df in frames:
+            path = self.persist(key, df) or self._write(df, self.spill_dir, key)
+            with self._lock:
+                if self._spilling.pop(key, None) is not None:
+                    self._files.setdefault(key, path)
+                elif key not in self._refs and path != self.persisted_path(key) and os.path.exists(path):
+                    os.remove(path)  # released while it was being written
+
+    def remove_spill_dir(self) -> None:
+        """Delete this process's spill files (at shutdown)."""
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def remove_stale_spill_dirs(self) -> int:
+        """Delete spill directories left by processes that are no longer running (at startup).
+        Returns how many were removed."""
+        if not os.path.isdir(self.spill_root):
+            return 0
+        removed = 0
+        for name in os.listdir(self.spill_root):
+            path = os.path.join(self.spill_root, name)
+            pid, _, _ = name.partition("-")
+            if path == self.spill_dir or not os.path.isdir(path) or not pid.isdigit():
+                continue
+            # Our own pid under another name is a previous run (e.g. pid 1 in a container)
+            if int(pid) == os.getpid() or not _alive(int(pid)):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def enable_persistence(self, persist_dir: str) -> None:
+        os.makedirs(persist_dir, exist_ok=True)
+        self.persist_dir = persist_dir
+
+    @staticmethod
+    def file_stem(key: str) -> str:
+        return key.replace(":", "_").replace("/", "_")
+
+    def persisted_path(self, key: str) -> Optional[str]:
+        """Durable file for `key` under persist_dir, if one exists."""
+        if not self.persist_dir:
+            return None
+        base = os.path.join(self.persist_dir, self.file_stem(key))
+        for path in (base + ".feather", base + ".pkl"):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def persist(self, key: str, df: Optional[pd.DataFrame] = None) -> Optional[str]:
+        """Write the frame for `key` to persist_dir (once) and return the file path.
+
+        The file is written without holding the store's lock, so a multi-GB upload being
+        persisted doesn't stall every other get()."""
+        if not self.persist_dir:
+            return None
+        with self._lock:
+            path = self._persisted.get(key)
+        if path and os.path.exists(path):
+            os.utime(path)  # re-referenced: restarts the sweeper's grace period for unreferenced files
+            return path
+        path = self.persisted_path(key)
+        if path:
+            os.utime(path)
+        else:
+            path = self._write(self.get(key) if df is None else df, self.persist_dir, key)
+        mapped = None
+        with self._lock:
+            swap = key in self._frames and key not in self._mapped and path.endswith(".feather")
+        if swap:
+            mapped = self._read(path)
+        with self._lock:
+            if key not in self._refs:
+                return path  # released meanwhile; the sweeper removes the file if nothing references it
+            self._persisted[key] = path
+            self._files.setdefault(key, path)
+            if mapped is not None and key in self._frames and key not in self._mapped:
+                # Swap the private copy for a view of the file other workers map too
+                self._frames[key] = mapped
+                self._mark_mapped(key, path)
+        return path
+
+    def is_persisted(self, key: str) -> bool:
+        with self._lock:
+            return key in self._persisted
+
+    def _write(self, df: pd.DataFrame, directory: str, key: str) -> str:
+        # Write to a temp name and rename, so concurrent readers (other workers) never see a partial file
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.file_stem(key))
+        tmp = f"{base}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"  # unique per writer thread too
+        try:
+            if HAS_PYARROW:
+                try:
+                    # Uncompressed so loads can map the file instead of decompressing into private memory
+                    df.to_feather(tmp, compression="uncompressed")
+                    os.replace(tmp, base + ".feather")
+                    return base + ".feather"
+                except Exception:
+                    pass  # e.g. mixed-type object columns Arrow can't represent
+            df.to_pickle(tmp)
+            os.replace(tmp, base + ".pkl")
+            return base + ".pkl"
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @staticmethod
+    def _read(path: str) -> pd.DataFrame:
+        if not path.endswith(".feather"):
+            return pd.read_pickle(path)
+        # split_blocks keeps each column its own block so numeric columns stay zero-copy views
+        return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+    def _mark_mapped(self, key: str, path: str) -> None:
+        if path.endswith(".feather"):
+            self._mapped.add(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "frames": len(self._refs),
+                "resident": len(self._frames),
+                "spilled": len(self._refs) - len(self._frames),
+                "mapped": len(self._mapped),
+                "references": sum(self._refs.values()),
+                "resident_bytes": self.resident_bytes(),
+                "budget_bytes": self.budget_bytes,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+            }
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+# Shared by every DataRegistry in the process
+FRAMES = FrameStore()
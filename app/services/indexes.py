@@ -0,0 +1,193 @@
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from app.services.utils import as_datetime64
+
+# Build bitmap indexes on low-cardinality columns for filters and group-bys
+DATA_INDEXES = os.getenv("DATA_INDEXES", "1").strip().lower() not in ("0", "false", "no")
+# Per-value bitmaps kept per column (least-recently-used values are rebuilt on demand)
+INDEX_BITMAPS_PER_COLUMN = int(os.getenv("INDEX_BITMAPS_PER_COLUMN", "64"))
+# Index datetime columns in time order at upload so date ranges are binary searches instead of scans
+TIME_INDEXES = os.getenv("TIME_INDEXES", "1").strip().lower() not in ("0", "false", "no")
+
+class CategoryIndex:
+    """Dictionary codes for one low-cardinality column plus lazily built per-value bitmaps.
+
+    Bitmaps are packed (one bit per row), so combining equality/IN predicates is a
+    bytewise OR/AND over n/8 bytes, and group-bys are a bincount over the codes."""
+
+    def __init__(self, s: pd.Series):
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            self.codes = s.cat.codes.to_numpy()  # shares the column's own codes
+            self.categories = s.cat.categories
+        else:
+            codes, self.categories = pd.factorize(s, sort=True)  # sorted like groupby's keys
+            self.codes = codes.astype(np.int32 if len(self.categories) >= 2**15 else np.int16)
+        self.rows = len(self.codes)
+        self.counts = np.bincount(self.codes[self.codes >= 0], minlength=len(self.categories))
+        self._bitmaps: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def code(self, value: Any) -> int:
+        """Code for a value, -1 when it doesn't occur in the column."""
+        try:
+            loc = self.categories.get_indexer([value])[0]
+        except (TypeError, ValueError):
+            return -1
+        return int(loc)
+
+    def _bitmap(self, code: int) -> np.ndarray:
+        with self._lock:
+            if code in self._bitmaps:
+                self._bitmaps.move_to_end(code)
+                return self._bitmaps[code]
+        bits = np.packbits(self.codes == code)
+        with self._lock:
+            self._bitmaps[code] = bits
+            while len(self._bitmaps) > INDEX_BITMAPS_PER_COLUMN:
+                self._bitmaps.popitem(last=False)
+        return bits
+
+    def bits(self, values: Iterable[Any]) -> np.ndarray:
+        """Packed bitmap of rows equal to any of `values`."""
+        out = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+        for code in {self.code(v) for v in values}:
+            if code >= 0:
+                out |= self._bitmap(code)
+        return out
+
+    def group(self, values: pd.Series, agg: str) -> pd.Series:
+        """sum/mean/count of `values` per category (observed groups only, missing keys dropped),
+        in the same order as `groupby(col, observed=True)`."""
+        valid = self.codes >= 0
+        codes = self.codes[valid]
+        if agg == "count":
+            present = values.notna().to_numpy()[valid]
+            out = np.bincount(codes[present], minlength=len(self.categories))
+        else:
+            arr = values.to_numpy(dtype="float64", na_value=np.nan)[valid]
+            present = ~np.isnan(arr)
+            sums = np.bincount(codes[present], weights=arr[present], minlength=len(self.categories))
+            if agg == "mean":
+                n = np.bincount(codes[present], minlength=len(self.categories))
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    out = sums / n
+            elif pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values):
+                out = sums.astype(np.int64)
+            else:
+                out = sums
+        observed = self.counts > 0
+        return pd.Series(out[observed], index=self.categories[observed], name=values.name)
+
+def unpack(bits: np.ndarray, rows: int) -> np.ndarray:
+    """Packed bitmap -> boolean row mask."""
+    return np.unpackbits(bits, count=rows).view(bool)
+
+_NAT = np.iinfo(np.int64).min
+
+class TimeIndex:
+    """Row positions of one datetime column in time order.
+
+    A date range is two binary searches over the sorted values; the matching rows are
+    a contiguous run of `order` (or a plain row slice when the column is already sorted)."""
+
+    def __init__(self, s: pd.Series):
+        s = as_datetime64(s)
+        self.tz = s.dt.tz
+        if self.tz is not None:
+            s = s.dt.tz_convert("UTC").dt.tz_localize(None)
+        values = s.to_numpy(dtype="datetime64[ns]").view(np.int64)  # NaT is int64 min, so it sorts first
+        self.rows = len(values)
+        if self.rows < 2 or bool((values[1:] >= values[:-1]).all()):
+            self.order: Optional[np.ndarray] = None
+            self.sorted = values
+        else:
+            order = np.argsort(values, kind="stable")
+            self.order = order.astype(np.int32) if self.rows < 2**31 else order
+            self.sorted = values[order]
+        self.first = int(np.searchsorted(self.sorted, _NAT, side="right"))  # skip missing dates
+
+    def _ns(self, value: pd.Timestamp) -> Optional[int]:
+        ts = pd.Timestamp(value)
+        if (ts.tz is None) != (self.tz is None):
+            return None  # naive vs aware: let the regular comparison report it
+        if ts.tz is not None:
+            ts = ts.tz_convert("UTC").tz_localize(None)
+        return int(ts.as_unit("ns").value)
+
+    def window(self, low: Any = None, high: Any = None, low_closed: bool = True,
+               high_closed: bool = True) -> Optional[Tuple[int, int]]:
+        """[lo, hi) into the time order for rows with low <(=) value <(=) high; None if a bound doesn't fit."""
+        lo, hi = self.first, self.rows
+        if low is not None:
+            ns = self._ns(low)
+            if ns is None:
+                return None
+            lo = max(lo, int(np.searchsorted(self.sorted, ns, side="left" if low_closed else "right")))
+        if high is not None:
+            ns = self._ns(high)
+            if ns is None:
+                return None
+            hi = int(np.searchsorted(self.sorted, ns, side="right" if high_closed else "left"))
+        return lo, max(lo, hi)
+
+    def positions(self, lo: int, hi: int) -> Union[slice, np.ndarray]:
+        """Rows in a window, in row order (a slice when the column is sorted)."""
+        if self.order is None:
+            return slice(lo, hi)
+        return np.sort(self.order[lo:hi])
+
+    def mask(self, lo: int, hi: int) -> np.ndarray:
+        out = np.zeros(self.rows, dtype=bool)
+        out[slice(lo, hi) if self.order is None else self.order[lo:hi]] = True
+        return out
+
+Index = Union[CategoryIndex, TimeIndex]
+
+class DatasetIndexes:
+    """Indexes for one dataset version: bitmaps on categorical columns (built per column on
+    first use) and time orders on datetime columns (built at upload, see build_times).
+
+    Kept in the dataset's derived-artifact cache (see DataRegistry.cached), so they are
+    shared by sessions on the same upload and dropped when the table is replaced. The
+    frame itself is passed in on lookup rather than held, so spilling it isn't blocked."""
+
+    def __init__(self, categorical: List[str], datetime: Iterable[str] = ()):
+        self.eligible = {**{c: CategoryIndex for c in categorical},
+                         **({c: TimeIndex for c in datetime} if TIME_INDEXES else {})}
+        self._indexes: Dict[str, Optional[Index]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, df: pd.DataFrame, column: str) -> Optional[Index]:
+        """Index for `column` of `df` (the frame these indexes belong to), or None."""
+        kind = self.eligible.get(column)
+        if kind is None or column not in df.columns:
+            return None
+        with self._lock:
+            if column not in self._indexes:
+                try:
+                    self._indexes[column] = kind(df[column])
+                except (TypeError, ValueError, AttributeError, NotImplementedError) as e:
+                    print(f"[indexes] skipping {column!r}: {e}")
+                    self._indexes[column] = None
+            return self._indexes[column]
+
+    def build_times(self, df: pd.DataFrame) -> None:
+        """Build every datetime column's time index now, so the first date-range query doesn't pay for it."""
+        for column, kind in self.eligible.items():
+            if kind is TimeIndex:
+                self.get(df, column)
+
+    def lookup(self, df: pd.DataFrame) -> Callable[[str], Optional[Index]]:
+        return lambda column: self.get(df, column)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {c: ({"categories": len(ix.categories), "bitmaps": len(ix._bitmaps)}
+                        if isinstance(ix, CategoryIndex) else {"sorted": ix.order is None})
+                    for c, ix in self._indexes.items() if ix is not None}
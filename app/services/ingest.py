@@ -0,0 +1,260 @@
+from __future__ import annotations
+import hashlib
+import io
+import os
+import re
+import tempfile
+import warnings
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from app.services.frame_store import FRAMES
+from app.services.utils import snake_case, infer_schema
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+try:  # optional: Arrow-backed CSV parsing
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# "pandas" (default C parser, object strings) or "pyarrow" (multithreaded, Arrow-backed dtypes)
+INGEST_ENGINE = os.getenv("INGEST_ENGINE", "pandas").strip().lower()
+# Downcast numerics / categorize low-cardinality strings after load
+INGEST_COMPACT = os.getenv("INGEST_COMPACT", "1").strip().lower() not in ("0", "false", "no")
+# Rows sampled per column to vote on numeric/datetime typing
+INGEST_SAMPLE_SIZE = int(os.getenv("INGEST_SAMPLE_SIZE", "1000"))
+
+CHUNK_SIZE = 1 << 20  # 1 MiB copy buffer
+SNIFF_BYTES = 8192
+UPLOAD_TMP_DIR: Optional[str] = os.getenv("UPLOAD_TMP_DIR") or None
+
+
+def spool_to_disk(src: BinaryIO) -> Tuple[str, str]:
+    """Copy an upload stream to a temp file in fixed-size chunks, hashing as it goes.
+
+    Returns (path, sha256 hex digest). Only one chunk is held in memory at a time;
+    the caller owns (and deletes) the file."""
+    fd, path = tempfile.mkstemp(prefix="upload_", dir=UPLOAD_TMP_DIR)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def sniff_format(head: bytes) -> str:
+    """Guess the file format from its first bytes: 'xlsx', 'xls' or 'csv'."""
+    if head.startswith(b"PK\x03\x04"):  # zip container (xlsx)
+        return "xlsx"
+    if head.startswith(b"\xd0\xcf\x11\xe0"):  # OLE2 container (legacy xls)
+        return "xls"
+    return "csv"
+
+
+def read_csv(source, engine: Optional[str] = None) -> pd.DataFrame:
+    """Parse CSV with the configured engine; falls back to pandas when pyarrow isn't installed."""
+    engine = engine or INGEST_ENGINE
+    if engine == "pyarrow" and HAS_PYARROW:
+        # Arrow's reader is multithreaded and infers numbers/timestamps itself; strings come
+        # back as string[pyarrow] rather than Python objects
+        return pd.read_csv(source, engine="pyarrow", dtype_backend="pyarrow")
+    return pd.read_csv(source)
+
+
+def read_table(source: Union[str, bytes], engine: Optional[str] = None) -> pd.DataFrame:
+    """Parse a CSV or Excel file from a path (preferred) or raw bytes."""
+    if isinstance(source, bytes):
+        head = source[:SNIFF_BYTES]
+        open_source = lambda: io.BytesIO(source)  # noqa: E731
+    else:
+        with open(source, "rb") as fh:
+            head = fh.read(SNIFF_BYTES)
+        open_source = lambda: source  # noqa: E731
+
+    if sniff_format(head) != "csv":
+        return pd.read_excel(open_source(), sheet_name=0)
+    try:
+        return read_csv(open_source(), engine)
+    except Exception:
+        # Fallback to Excel for containers the sniffer didn't recognise
+        return pd.read_excel(open_source(), sheet_name=0)
+
+
+def _sample(s: pd.Series, n: int) -> pd.Series:
+    """Bounded random sample of a column (nulls included), in original row order."""
+    if len(s) <= n:
+        return s
+    positions = np.sort(np.random.default_rng(0).choice(len(s), size=n, replace=False))
+    return s.iloc[positions]
+
+
+def _is_text(s: pd.Series) -> bool:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return False
+    return pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)
+
+
+# pandas >= 2 needs format="mixed" to parse heterogeneous strings element-wise
+_MIXED_FORMAT = "mixed" if int(pd.__version__.split(".")[0]) >= 2 else None
+_digits = re.compile(r"\d")
+# "shape" of a date string (digits -> 9) -> strftime format that parsed it last time
+_DATETIME_FORMATS: Dict[str, Optional[str]] = {}
+
+
+def detect_datetime_format(values: pd.Series) -> Optional[str]:
+    """Find one strftime format that parses every value, reusing formats seen for the same shape."""
+    values = values.astype(str)
+    if values.empty:
+        return None
+    shape = _digits.sub("9", values.iloc[0])
+    candidates = [_DATETIME_FORMATS.get(shape)]
+    with warnings.catch_warnings():
+        # pandas warns when dayfirst can't apply (e.g. ISO dates); the guess is still valid
+        warnings.simplefilter("ignore", UserWarning)
+        for v in values.iloc[:: max(1, len(values) // 5)][:5]:
+            candidates += [guess_datetime_format(v), guess_datetime_format(v, dayfirst=True)]
+    for fmt in dict.fromkeys(c for c in candidates if c):
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+        if parsed.notna().all():
+            _DATETIME_FORMATS[shape] = fmt
+            return fmt
+    return None
+
+
+def _to_datetime(s: pd.Series, n: int) -> Optional[pd.Series]:
+    """Datetime conversion when a sample says the column is dates; None to leave it untouched."""
+    sample = _sample(s, n).dropna()
+    if sample.empty:
+        return None
+    fmt = detect_datetime_format(sample)
+    if fmt is None:
+        # No single format: let pandas parse per value, but only commit if the sample parses cleanly
+        fmt = _MIXED_FORMAT
+        if pd.to_datetime(sample, format=fmt, errors="coerce").isna().any():
+            return None
+    converted = pd.to_datetime(s, format=fmt, errors="coerce")
+    # Like the old errors="ignore": all-or-nothing, never turn values into NaT
+    if converted.notna().sum() != s.notna().sum():
+        return None
+    return converted
+
+
+def _to_numeric(s: pd.Series) -> pd.Series:
+    """pd.to_numeric(errors="coerce") where unparseable values become missing for every backend.
+
+    On Arrow strings the default coerces them to NaN, which Arrow (and notna) treat as a value."""
+    if isinstance(s.dtype, pd.ArrowDtype):
+        return pd.to_numeric(s, errors="coerce", dtype_backend="pyarrow")
+    return pd.to_numeric(s, errors="coerce")
+
+
+def prepare_frame(df: pd.DataFrame, sample_size: Optional[int] = None) -> pd.DataFrame:
+    """Normalize headers and apply opportunistic date/numeric typing.
+
+    Types are voted on a bounded random sample per column; only columns the sample
+    votes for pay for a full conversion."""
+    n = sample_size or INGEST_SAMPLE_SIZE
+    # Normalize headers
+    df.columns = [snake_case(c) for c in df.columns]
+
+    # Opportunistic typing: dates & numerics (safe, non-destructive)
+    for c in df.columns:
+        # date-like
+        if any(tok in c for tok in ["date", "time", "timestamp"]) and _is_text(df[c]):
+            try:
+                converted = _to_datetime(df[c], n)
+                if converted is not None:
+                    df[c] = converted
+            except Exception:
+                pass
+        # numeric coercion for string/object columns
+        if _is_text(df[c]):
+            try:
+                sample = _sample(df[c], n)
+                if _to_numeric(sample).notna().sum() <= 0.5 * len(sample):
+                    continue
+                coerced = _to_numeric(df[c])
+                if coerced.notna().sum() > max(10, int(0.5 * len(df))):
+                    df[c] = coerced
+            except Exception:
+                pass
+    return df
+
+
+def load_dataframe(source: Union[str, bytes], engine: Optional[str] = None) -> pd.DataFrame:
+    """Read + prepare a dataset from a path or bytes."""
+    return prepare_frame(read_table(source, engine))
+
+
+def _compact_column(s: pd.Series, categorical: bool) -> pd.Series:
+    if isinstance(s.dtype, pd.ArrowDtype):
+        # Arrow numerics are already tightly typed; only dictionary-encode repeated strings
+        return s.astype("category") if categorical else s
+    if pd.api.types.is_bool_dtype(s):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        unsigned = s.notna().any() and s.min() >= 0
+        return pd.to_numeric(s, downcast="unsigned" if unsigned else "integer")
+    if pd.api.types.is_float_dtype(s):
+        # Kept at float64 even when values would round-trip: sums and means run in the
+        # column's dtype, and float32 accumulators drift by hundreds on a few million rows
+        return s
+    if categorical:
+        return s.astype("category")
+    return s
+
+
+def compact_dtypes(df: pd.DataFrame) -> Dict[str, Any]:
+    """Shrink a frame in place: smallest lossless integer widths, category dtype for the
+    low-cardinality string columns infer_schema buckets as categorical.
+
+    Returns a before/after memory report (bytes), overall and per column."""
+    categorical = set(infer_schema(df)["categorical"])
+    columns: Dict[str, Dict[str, Any]] = {}
+    for c in df.columns:
+        s = df[c]
+        before = int(s.memory_usage(deep=True, index=False))
+        new = _compact_column(s, c in categorical)
+        after = int(new.memory_usage(deep=True, index=False)) if new is not s else before
+        if after < before:
+            df[c] = new
+        else:
+            new, after = s, before
+        columns[c] = {"dtype_before": str(s.dtype), "dtype_after": str(new.dtype), "before": before, "after": after}
+    return {
+        "before": sum(v["before"] for v in columns.values()),
+        "after": sum(v["after"] for v in columns.values()),
+        "columns": columns,
+    }
+
+
+def content_key(digest: str) -> str:
+    """Store key for an upload: its content hash plus the ingest settings that shape the frame."""
+    return f"sha256:{digest}:{INGEST_ENGINE}:{int(INGEST_COMPACT)}:{INGEST_SAMPLE_SIZE}"
+
+
+def load_upload(source: Union[str, bytes], digest: str) -> Tuple[str, pd.DataFrame, Optional[Dict[str, Any]]]:
+    """Parse an upload, or reuse the shared frame if identical content was already loaded.
+
+    Returns (store key, frame, compaction report)."""
+    key = content_key(digest)
+    df = FRAMES.lookup(key)
+    if df is not None:
+        return key, df, FRAMES.derived(key).get("memory")
+    df = load_dataframe(source)
+    memory = compact_dtypes(df) if INGEST_COMPACT else None
+    return key, df, memory
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Latency histogram buckets (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+class Metrics:
+    """Process-wide counters and latency histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}  # bucket counts + [sum, count]
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, metric: str, value: float = 1, **labels) -> None:
+        key = (metric, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, metric: str, seconds: float, **labels) -> None:
+        key = (metric, _labels(labels))
+        with self._lock:
+            h = self._histograms.setdefault(key, [0.0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        seen = set()
+
+        def header(name: str) -> None:
+            if name not in seen and name in self._help:
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            seen.add(name)
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+        for (name, labels), h in histograms:
+            header(name)
+            for bound, count in zip(BUCKETS, h):
+                lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', f'{bound:g}'),))} {count:g}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {h[-1]:g}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-2]:.6f}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+METRICS.describe("cde_span_seconds", "histogram", "Time spent per request phase (request, router, tool, agent, llm, serialize)")
+METRICS.describe("cde_llm_tokens_total", "counter", "Model tokens by kind (prompt/completion)")
+METRICS.describe("cde_llm_calls_total", "counter", "Model calls")
+
+class Trace:
+    """Spans recorded while serving one request; returned as ChatOut.debug when asked for."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: str, seconds: float, **attrs) -> None:
+        with self._lock:
+            self.spans.append({"span": span, "ms": round(seconds * 1000, 2), **attrs})
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {"total_ms": round((time.perf_counter() - self.start) * 1000, 2), "spans": spans}
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+def start_trace() -> Trace:
+    """Begin a trace for the current request. Worker threads started via anyio's to_thread
+    copy the context, so spans recorded there land in the same trace."""
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+def record(span: str, seconds: float, name: Optional[str] = None, **attrs) -> None:
+    """Observe a finished span in the histograms and the current request's trace."""
+    METRICS.observe("cde_span_seconds", seconds, span=span, **({"name": name} if name else {}))
+    trace = _current.get()
+    if trace is not None:
+        trace.add(span, seconds, **({"name": name} if name else {}), **attrs)
+
+@contextmanager
+def span(span_name: str, name: Optional[str] = None, **attrs) -> Iterator[Dict[str, Any]]:
+    """Time a block. The yielded dict is recorded with the span, so the body can add attributes."""
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record(span_name, time.perf_counter() - start, name, **attrs)
+
+def record_llm_metrics(run_metrics: Optional[Dict[str, Any]]) -> None:
+    """One `llm` span per model call from an agno RunResponse.metrics dict (lists per call)."""
+    if not run_metrics:
+        return
+    times = run_metrics.get("time") or []
+    prompt = run_metrics.get("input_tokens") or []
+    completion = run_metrics.get("output_tokens") or []
+    for i in range(max(len(times), len(prompt), len(completion))):
+        p = prompt[i] if i < len(prompt) else 0
+        c = completion[i] if i < len(completion) else 0
+        METRICS.inc("cde_llm_calls_total")
+        METRICS.inc("cde_llm_tokens_total", p, kind="prompt")
+        METRICS.inc("cde_llm_tokens_total", c, kind="completion")
+        record("llm", times[i] if i < len(times) else 0.0, prompt_tokens=p, completion_tokens=c)
@@ -19,7 +19,7 @@ def plot_and_save(
         raise ValueError("Missing x or y column")
     data = df
     if agg:
-        data = df.groupby(x)[y].agg(agg).reset_index()
+        data = df.groupby(x, observed=True)[y].agg(agg).reset_index()
     else:
         data = df[[x, y]].dropna()
 
@@ -0,0 +1,98 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+TOP_VALUES = 5
+DESCRIBE_ROWS = ["count", "unique", "top", "freq", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+def _py(v: Any) -> Any:
+    """numpy scalars -> plain Python so profiles serialize cleanly."""
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+def _missing(v: Any) -> bool:
+    return v is None or (np.isscalar(v) and pd.isna(v)) or v is pd.NaT
+
+def _is_categorical_dtype(s: pd.Series) -> bool:
+    return isinstance(s.dtype, pd.CategoricalDtype)
+
+def profile_column(s: pd.Series) -> Dict[str, Any]:
+    """One pass of per-column statistics: dtype, nulls, cardinality, range, quantiles, top values."""
+    count = int(s.count())
+    info: Dict[str, Any] = {"dtype": str(s.dtype), "count": count, "nulls": int(len(s) - count)}
+
+    if pd.api.types.is_numeric_dtype(s):
+        info["kind"] = "numeric"
+    elif pd.api.types.is_datetime64_any_dtype(s):
+        info["kind"] = "datetime"
+    elif _is_categorical_dtype(s) or pd.api.types.is_string_dtype(s) or pd.api.types.is_object_dtype(s):
+        info["kind"] = "string"
+    else:
+        info["kind"] = "other"
+
+    try:
+        counts = s.value_counts(dropna=True)
+        info["unique"] = int(len(counts))
+        info["top_values"] = {str(k): int(v) for k, v in counts.head(TOP_VALUES).items()}
+        if len(counts):
+            info["top"], info["freq"] = _py(counts.index[0]), int(counts.iloc[0])
+    except TypeError:  # unhashable values (lists/dicts in object columns)
+        info["unique"] = None
+        info["top_values"] = {}
+
+    if info["kind"] == "numeric" and not pd.api.types.is_bool_dtype(s) and count:
+        q = s.quantile([0.25, 0.5, 0.75])
+        info.update({
+            "mean": _py(s.mean()), "std": _py(s.std()),
+            "min": _py(s.min()), "max": _py(s.max()),
+            "25%": _py(q.iloc[0]), "50%": _py(q.iloc[1]), "75%": _py(q.iloc[2]),
+        })
+    elif info["kind"] == "datetime" and count:
+        q = s.quantile([0.25, 0.5, 0.75])
+        info.update({
+            "mean": s.mean(), "min": s.min(), "max": s.max(),
+            "25%": q.iloc[0], "50%": q.iloc[1], "75%": q.iloc[2],
+        })
+    return info
+
+class DatasetProfile:
+    """Column statistics computed once per dataset version, so tools answer schema/describe
+    questions from O(columns) lookups instead of rescanning the frame."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.rows = len(df)
+        self.columns: Dict[str, Dict[str, Any]] = {c: profile_column(df[c]) for c in df.columns}
+        self.schema = self._schema()
+
+    def _schema(self) -> Dict[str, List[str]]:
+        # Same buckets as utils.infer_schema
+        numeric = [c for c, p in self.columns.items() if p["kind"] == "numeric"]
+        datetime = [c for c, p in self.columns.items() if p["kind"] == "datetime"]
+        limit = max(50, int(self.rows * 0.2))
+        categorical = [
+            c for c, p in self.columns.items()
+            if p["kind"] == "string" and p["unique"] is not None and p["unique"] <= limit
+        ]
+        return {"numeric": numeric, "datetime": datetime, "categorical": categorical}
+
+    def numeric_columns(self) -> List[str]:
+        return list(self.schema["numeric"])
+
+    def describe(self, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Rows shaped like `df.describe(include="all").fillna("").reset_index()` records."""
+        cols = columns or list(self.columns)
+        stats = {c: self.columns[c] for c in cols}
+        rows = []
+        for stat in DESCRIBE_ROWS:
+            row: Dict[str, Any] = {"index": stat}
+            for c, p in stats.items():
+                # Numeric and datetime columns don't report unique/top/freq in pandas' describe
+                ranged = p["kind"] == "datetime" or (p["kind"] == "numeric" and p["dtype"] != "bool")
+                hidden = ranged and stat in ("unique", "top", "freq")
+                v = "" if hidden else p.get(stat, "")
+                row[c] = "" if _missing(v) else v
+            if any(v != "" for k, v in row.items() if k != "index"):
+                rows.append(row)
+        return rows
@@ -0,0 +1,62 @@
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+# Tool results kept per dataset version (0 disables caching)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "128"))
+
+# Process-wide counters across every dataset's cache, for /stats
+_totals = {"hits": 0, "misses": 0, "evictions": 0}
+_totals_lock = threading.Lock()
+
+class ResultCache:
+    """LRU cache of tool results for one dataset version.
+
+    Instances live in the dataset's derived-artifact cache (DataRegistry.cached), so they
+    are keyed by the dataset fingerprint implicitly and dropped when the table is replaced.
+    Cached results are shared: callers must not mutate them."""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._results: "OrderedDict[Hashable, Any]" = OrderedDict()  # LRU first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Cached result for `key`, or `compute()`. Results with an "error" key aren't cached."""
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                _count("hits")
+                return self._results[key]
+            self.misses += 1
+        _count("misses")
+        result = compute()  # outside the lock: a duplicate computation beats serializing tools
+        if self.max_entries <= 0 or (isinstance(result, dict) and "error" in result):
+            return result
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+                self.evictions += 1
+                _count("evictions")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._results), "max": self.max_entries,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+def _count(name: str) -> None:
+    with _totals_lock:
+        _totals[name] += 1
+
+def totals() -> Dict[str, int]:
+    with _totals_lock:
+        return dict(_totals)
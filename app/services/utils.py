@@ -11,6 +11,14 @@ def snake_case(s: str) -> str:
     s = re.sub(r"\s+", "_", s)
     return s.lower()
 
+def as_datetime64(s: pd.Series) -> pd.Series:
+    """Arrow date/timestamp columns (INGEST_ENGINE=pyarrow) as numpy datetime64, which the
+    .dt tz accessors and Timestamp comparisons support; other columns unchanged."""
+    if isinstance(s.dtype, pd.ArrowDtype) and s.dtype.kind == "M":
+        tz = getattr(s.dtype.pyarrow_dtype, "tz", None)
+        return s.astype(f"datetime64[ns, {tz}]" if tz else "datetime64[ns]")
+    return s
+
 def infer_schema(df: pd.DataFrame) -> Dict[str, List[str]]:
     """Infer simple schema buckets for generic behavior across any CSV."""
     numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
@@ -19,7 +27,9 @@ def infer_schema(df: pd.DataFrame) -> Dict[str, List[str]]:
     for c in df.columns:
         if c in numeric_cols or c in datetime_cols:
             continue
-        if pd.api.types.is_string_dtype(df[c]) or pd.api.types.is_object_dtype(df[c]):
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            categorical_cols.append(c)
+        elif pd.api.types.is_string_dtype(df[c]) or pd.api.types.is_object_dtype(df[c]):
             try:
                 # low-cardinality strings → categorical
                 if df[c].nunique(dropna=True) <= max(50, int(len(df) * 0.2)):
@@ -79,8 +89,10 @@ def smart_column_finder(df: pd.DataFrame, intent: str) -> Dict[str, str]:
     
     return result
 
-def resolve_column(df: pd.DataFrame, user_term: str) -> str | None:
-    """Enhanced column resolution with smart mapping."""
+def resolve_column(df: pd.DataFrame, user_term: str, fuzzy: bool = True) -> str | None:
+    """Enhanced column resolution with smart mapping.
+
+    `fuzzy=False` skips the difflib fallback, for callers that must not guess."""
     if not user_term:
         return None
         
@@ -109,6 +121,9 @@ def resolve_column(df: pd.DataFrame, user_term: str) -> str | None:
     if user_lower in ['date', 'time'] and 'date' in smart_map:
         return smart_map['date']
     
+    if not fuzzy:
+        return None
+
     # Fuzzy match as fallback
     cand = difflib.get_close_matches(user_term, cols, n=1, cutoff=0.6)
     return cand[0] if cand else None
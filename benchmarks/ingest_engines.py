@@ -0,0 +1,115 @@
+"""Compare CSV ingestion engines (pandas C parser vs pyarrow) on parse time and resident memory.
+
+Each measurement runs in a fresh subprocess so peak RSS isn't polluted by earlier runs.
+
+    python -m benchmarks.ingest_engines                      # default wide + long files
+    python -m benchmarks.ingest_engines --long-rows 5000000 --json out.json
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ENGINES = ["pandas", "pyarrow"]
+
+
+def make_csv(path: str, rows: int, cols: int, seed: int = 0) -> None:
+    """Mixed-type synthetic CSV: ints, floats, low-cardinality strings, ids and dates."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 5
+        if kind == 0:
+            data[f"int_{i}"] = rng.integers(0, 1_000_000, rows)
+        elif kind == 1:
+            data[f"float_{i}"] = rng.normal(100, 25, rows).round(3)
+        elif kind == 2:
+            data[f"category_{i}"] = rng.choice(["north", "south", "east", "west", "central"], rows)
+        elif kind == 3:
+            data[f"name_{i}"] = np.char.add("id_", rng.integers(0, rows, rows).astype(str))
+        else:
+            data[f"order_date_{i}"] = (pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, rows), unit="D")).strftime("%Y-%m-%d")
+    pd.DataFrame(data).to_csv(path, index=False)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process. Prefers VmHWM: ru_maxrss survives exec on Linux,
+    so a child would report its parent's high-water mark."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _worker(engine: str, path: str) -> None:
+    from app.services.ingest import load_dataframe
+
+    start = time.perf_counter()
+    df = load_dataframe(path, engine=engine)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "engine": engine,
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2**20, 1),
+        "rows": len(df),
+        "cols": len(df.columns),
+    }))
+
+
+def run(engine: str, path: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.ingest_engines", "--worker", engine, path],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--wide-rows", type=int, default=20_000)
+    ap.add_argument("--wide-cols", type=int, default=500)
+    ap.add_argument("--long-rows", type=int, default=1_000_000)
+    ap.add_argument("--long-cols", type=int, default=10)
+    ap.add_argument("--engines", nargs="+", default=ENGINES, choices=ENGINES)
+    ap.add_argument("--json", help="also write results to this file")
+    ap.add_argument("--worker", nargs=2, metavar=("ENGINE", "PATH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        _worker(*args.worker)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        shapes = {"wide": (args.wide_rows, args.wide_cols), "long": (args.long_rows, args.long_cols)}
+        for label, (rows, cols) in shapes.items():
+            path = os.path.join(tmp, f"{label}.csv")
+            make_csv(path, rows, cols)
+            size_mb = os.path.getsize(path) / 2**20
+            for engine in args.engines:
+                res = run(engine, path)
+                res.update({"file": label, "file_mb": round(size_mb, 1)})
+                results.append(res)
+                print(f"{label:5} {engine:8} {res['seconds']:8.3f}s  peak RSS {res['peak_rss_mb']:8.1f} MB"
+                      f"  frame {res['frame_mb']:8.1f} MB  ({rows}x{cols}, {size_mb:.1f} MB csv)")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
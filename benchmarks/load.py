@@ -0,0 +1,220 @@
+"""Load-test /upload and /chat offline: throughput, p50/p95/p99 latency and server RSS.
+
+By default a local server is started with LLM_BACKEND=stub (scripted model from
+benchmarks/fixtures/stub_llm.json), so no API key or network is needed. A chat counts as
+an error unless it returns 200 with no tool errors and the tables/chart its question calls for.
+
+    python -m benchmarks.load                                  # 8 concurrent clients, 200 chats
+    python -m benchmarks.load --concurrency 32 --requests 1000 --latency-ms 250
+    python -m benchmarks.load --max-p95-ms 500 --json out.json # fail (exit 1) on regression in CI
+    python -m benchmarks.load --url http://localhost:8000      # an already running server
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+
+# Mix of questions and what a correct answer carries: the first is answered by the
+# rule-based fast path, the rest go through the agent and the stub model's scripted tool calls
+QUESTIONS = [
+    ("top 10 customers by sales", {"tables"}),
+    ("Which customers are the best performers?", {"tables"}),
+    ("Plot the sales trend over time", {"chart_data"}),
+    ("Describe the data for me", {"tables"}),
+    ("Filter orders where sales are greater than 500", {"tables"}),
+    ("How do the regions compare?", {"tables", "chart_data"}),
+    ("Anything interesting in here?", set()),
+]
+
+
+def make_dataset(path: str, rows: int, seed: int = 0) -> None:
+    """Synthetic sales table matching the stub fixture's column names."""
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "order_id": np.arange(rows),
+        "customer": np.char.add("customer_", rng.integers(0, 500, rows).astype(str)),
+        "region": rng.choice(["north", "south", "east", "west", "central"], rows),
+        "category": rng.choice(["furniture", "office", "technology"], rows),
+        "sales": rng.gamma(2.0, 250.0, rows).round(2),
+        "quantity": rng.integers(1, 20, rows),
+        "order_date": (pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 1000, rows), unit="D")).strftime("%Y-%m-%d"),
+    }).to_csv(path, index=False)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(latency_ms: float, cache: bool, workers: int) -> tuple:
+    port = _free_port()
+    env = {**os.environ, "LLM_BACKEND": "stub", "LLM_STUB_LATENCY_MS": str(latency_ms)}
+    if not cache:
+        env.update({"ANSWER_CACHE_TTL_SECONDS": "0", "PLAN_CACHE_TTL_SECONDS": "0"})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited early:\n{proc.stderr.read()}")
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not become healthy within 60s")
+
+
+def server_rss_mb(pid: int) -> Dict[str, float]:
+    """Current and peak RSS of the server and its worker children (Linux /proc)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as fh:
+            pids += [int(p) for p in fh.read().split()]
+    except OSError:
+        pass
+    rss = peak = 0.0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as fh:
+                for line in fh:
+                    if line.startswith("VmRSS:"):
+                        rss += int(line.split()[1]) / 1024
+                    elif line.startswith("VmHWM:"):
+                        peak += int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    return {"rss_mb": round(rss, 1), "peak_rss_mb": round(peak, 1)}
+
+
+def percentiles(latencies: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    arr = np.asarray(latencies) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(arr, q)), 2) for q in (50, 95, 99)}
+
+
+def timed(fn) -> tuple:
+    """(seconds, ok) for one call; `fn` returns whether the response was a success."""
+    start = time.perf_counter()
+    try:
+        ok = bool(fn())
+    except requests.RequestException:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def answered(r: requests.Response, expect: set) -> bool:
+    """A chat succeeded: HTTP 200, no tool reported an error (debug trace) and the
+    tables/chart the question should produce are present."""
+    if not r.ok:
+        return False
+    body = r.json()
+    if body.get("error") or any("error" in s for s in (body.get("debug") or {}).get("spans", [])):
+        return False
+    return all(body.get(field) for field in expect)
+
+
+def run_phase(name: str, calls: list, concurrency: int) -> Dict[str, object]:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(timed, calls))
+    elapsed = time.perf_counter() - start
+    latencies = [t for t, ok in results if ok]
+    return {
+        "phase": name,
+        "requests": len(results),
+        "errors": sum(not ok for _, ok in results),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else None,
+        **percentiles(latencies),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="target an existing server instead of starting a stub-backed one")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--sessions", type=int, help="sessions to spread chats over (default: concurrency)")
+    ap.add_argument("--requests", type=int, default=200, help="chat requests to send")
+    ap.add_argument("--rows", type=int, default=50_000, help="rows in the uploaded dataset")
+    ap.add_argument("--latency-ms", type=float, default=50, help="simulated model latency per call")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned server")
+    ap.add_argument("--cache", action="store_true", help="leave the answer/plan caches enabled")
+    ap.add_argument("--max-p95-ms", type=float, help="exit 1 if chat p95 latency exceeds this")
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args()
+
+    proc = None
+    url = args.url
+    if not url:
+        proc, url = start_server(args.latency_ms, args.cache, args.workers)
+    sessions = args.sessions or args.concurrency
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sales.csv")
+            make_dataset(path, args.rows)
+            with open(path, "rb") as fh:
+                data = fh.read()
+
+            sids: List[str] = []
+
+            def upload():
+                r = requests.post(f"{url}/upload", files={"file": ("sales.csv", data, "text/csv")}, timeout=300)
+                if r.ok:
+                    sids.append(r.json()["session_id"])
+                return r.ok
+
+            results = [run_phase("upload", [upload] * sessions, args.concurrency)]
+
+        def chat(i: int):
+            question, expect = QUESTIONS[i % len(QUESTIONS)]
+            body = {"session_id": sids[i % len(sids)], "message": question, "debug": True}
+            return lambda: answered(requests.post(f"{url}/chat", json=body, timeout=300), expect)
+
+        if sids:
+            results.append(run_phase("chat", [chat(i) for i in range(args.requests)], args.concurrency))
+        server = server_rss_mb(proc.pid) if proc else {}
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    for res in results:
+        print(f"{res['phase']:6} {res['requests']:6} req  {res['errors']:4} err  {res['throughput_rps']:8} req/s"
+              f"  p50 {res['p50_ms']} ms  p95 {res['p95_ms']} ms  p99 {res['p99_ms']} ms")
+    if server:
+        print(f"server RSS {server['rss_mb']} MB (peak {server['peak_rss_mb']} MB)")
+
+    report = {"config": vars(args), "results": results, "server": server}
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    chat_res = next((r for r in results if r["phase"] == "chat"), None)
+    failed = any(r["errors"] for r in results) or chat_res is None
+    if args.max_p95_ms is not None and chat_res and (chat_res["p95_ms"] or 0) > args.max_p95_ms:
+        print(f"chat p95 {chat_res['p95_ms']} ms exceeds --max-p95-ms {args.max_p95_ms}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
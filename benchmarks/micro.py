@@ -0,0 +1,144 @@
+"""Time each data hot path in isolation on synthetic datasets, with peak traced memory.
+
+Operations: CSV parse (read_table), coercion (prepare_frame), dtype compaction, profiling,
+infer_schema, smart_column_finder, resolve_column and the top_k / filter_preview /
+describe / plot tools (called directly, result cache cleared before every run).
+
+    python -m benchmarks.micro                                         # 10k x 20
+    python -m benchmarks.micro --rows 10000 1000000 --cols 5 200 --json v2.json
+    python -m benchmarks.micro --only tool_top_k tool_filter_preview --baseline v1.json
+
+Shapes are the cross product of --rows and --cols. --baseline prints the change against
+an earlier --json file.
+"""
+from __future__ import annotations
+import argparse
+import inspect
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from benchmarks.ingest_engines import make_csv
+
+# Columns produced by make_csv for i % 5 == 0..4; tool arguments refer to these
+METRIC, GROUP, TEXT, DATE = "float_1", "category_2", "name_3", "order_date_4"
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Best/median wall time over `repeat` runs and the peak traced allocation of one run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"min_s": round(min(times), 6), "median_s": round(statistics.median(times), 6), "peak_mb": round(peak / 2**20, 2)}
+
+
+def operations(path: str) -> Dict[str, Callable[[], Any]]:
+    from app.agent import tools
+    from app.agent.memory import SessionMemory
+    from app.services.ingest import compact_dtypes, prepare_frame, read_table
+    from app.services.profile import DatasetProfile
+    from app.services.utils import infer_schema, resolve_column, smart_column_finder
+
+    raw = read_table(path)
+    df = prepare_frame(raw.copy())
+    compact = df.copy()
+    compact_dtypes(compact)
+
+    sid = "micro-bench"
+    mem = SessionMemory()
+    tools.SESSIONS[sid] = mem
+    mem.registry.put("bench", compact)
+    mem.registry.profile()  # tools read it; profiling is timed on its own below
+    derived = mem.registry.store.derived(mem.registry.fingerprint())
+
+    def tool(fn, **kwargs) -> Callable[[], Any]:
+        raw_fn = inspect.unwrap(fn.entrypoint)  # full result, no compaction for the model
+
+        def run():
+            derived.pop("results", None)  # time the computation, not the result cache
+            result = raw_fn(session_id=sid, **kwargs)
+            if "error" in result:
+                raise RuntimeError(f"{fn.name} failed: {result['error']}")  # don't time the error path
+            return result
+        return run
+
+    return {
+        "read_table": lambda: read_table(path),
+        "prepare_frame": lambda: prepare_frame(raw.copy()),
+        "compact_dtypes": lambda: compact_dtypes(df.copy()),
+        "profile": lambda: DatasetProfile(compact),
+        "infer_schema": lambda: infer_schema(compact),
+        "smart_column_finder": lambda: smart_column_finder(compact, "explore"),
+        "resolve_column": lambda: resolve_column(compact, "float 1"),
+        "tool_top_k": tool(tools.tool_top_k, metric=METRIC, group_by=GROUP, k=10),
+        "tool_filter_preview": tool(tools.tool_filter_preview, query=f"{METRIC} > 100 & {GROUP} == 'north'", limit=20),
+        "tool_describe": tool(tools.tool_describe),
+        "tool_plot": tool(tools.tool_plot, x=DATE, y=METRIC, kind="line", agg="sum"),
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path) as fh:
+        base = {(r["rows"], r["cols"], r["op"]): r for r in json.load(fh)["results"]}
+    print(f"\nvs {baseline_path} (median time, peak memory):")
+    for r in results:
+        b = base.get((r["rows"], r["cols"], r["op"]))
+        if not b or not b["median_s"]:
+            continue
+        dt = (r["median_s"] / b["median_s"] - 1) * 100
+        dm = (r["peak_mb"] / b["peak_mb"] - 1) * 100 if b["peak_mb"] else 0.0
+        print(f"  {r['rows']:>9}x{r['cols']:<5} {r['op']:20} time {dt:+7.1f}%  memory {dm:+7.1f}%")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[10_000])
+    ap.add_argument("--cols", type=int, nargs="+", default=[20])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", nargs="+", help="run just these operations")
+    ap.add_argument("--json", help="also write results to this file")
+    ap.add_argument("--baseline", help="compare against a previous --json file")
+    args = ap.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            for cols in args.cols:
+                cols = max(cols, 5)  # one column of each generated kind
+                path = os.path.join(tmp, f"{rows}x{cols}.csv")
+                make_csv(path, rows, cols)
+                ops = operations(path)
+                for name, fn in ops.items():
+                    if args.only and name not in args.only:
+                        continue
+                    res = {"rows": rows, "cols": cols, "op": name, **measure(fn, args.repeat)}
+                    results.append(res)
+                    print(f"{rows:>9}x{cols:<5} {name:20} min {res['min_s'] * 1000:10.2f} ms"
+                          f"  median {res['median_s'] * 1000:10.2f} ms  peak {res['peak_mb']:9.2f} MB")
+                os.remove(path)
+
+    if args.json:
+        meta = {"python": platform.python_version(), "pandas": pd.__version__, "repeat": args.repeat}
+        with open(args.json, "w") as fh:
+            json.dump({"meta": meta, "results": results}, fh, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
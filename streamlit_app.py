@@ -148,42 +148,68 @@ def create_chart_from_table(table_data, chart_type="bar"):
         return fig
     return None
 
+def iter_sse(response):
+    """Yield the JSON payload of each Server-Sent Event from a streaming response"""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data: "):
+            yield json.loads(line[len("data: "):])
+
 def send_message(message):
-    """Send message to backend and handle response"""
+    """Send message to backend and stream the response as it arrives"""
     if not message.strip():
         return
         
     # Add user message to chat
     st.session_state.messages.append({"role": "user", "content": message})
     
-    # Process the message
-    with st.spinner("🤖 Analyzing your data..."):
+    # Process the message, rendering tool progress and tokens live
+    with st.chat_message("assistant", avatar="🤖"):
+        status = st.empty()
+        placeholder = st.empty()
+        status.caption("🤖 Analyzing your data...")
         try:
-            response = requests.post(
-                f"{BACKEND_URL}/chat",
+            with requests.post(
+                f"{BACKEND_URL}/chat/stream",
                 json={
                     "session_id": st.session_state.session_id,
                     "message": message
-                }
-            )
+                },
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    error_msg = f"❌ Error: {response.text}"
+                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                    return
+
+                text = ""
+                result = None
+                for event in iter_sse(response):
+                    kind = event.get("event")
+                    if kind == "tool_start":
+                        status.caption(f"🔧 Running {event.get('tool')}...")
+                    elif kind == "tool_end":
+                        status.caption("🤖 Analyzing your data...")
+                    elif kind == "token":
+                        text += event.get("text", "")
+                        placeholder.markdown(text + "▌")
+                    elif kind == "done":
+                        result = event
+                    elif kind == "error":
+                        result = {"reply": f"❌ Error: {event.get('error')}"}
             
-            if response.status_code == 200:
-                result = response.json()
-                
-                # Store complete response
-                assistant_message = {
-                    "role": "assistant", 
-                    "content": result["reply"],
-                    "tables": result.get("tables"),
-                    "chart_data": result.get("chart_data"),
-                    "description": result.get("description")
-                }
-                
-                st.session_state.messages.append(assistant_message)
-                
-            else:
-                error_msg = f"❌ Error: {response.text}"
-                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+            if result is None:
+                result = {"reply": text or "❌ Error: the response ended unexpectedly."}
+            
+            # Store complete response
+            assistant_message = {
+                "role": "assistant", 
+                "content": result.get("reply") or text,
+                "tables": result.get("tables"),
+                "chart_data": result.get("chart_data"),
+                "description": result.get("description")
+            }
+            
+            st.session_state.messages.append(assistant_message)
                 
         except Exception as e:
             error_msg = f"🔌 Connection error: {str(e)}"
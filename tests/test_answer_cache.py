@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from app.services import answer_cache
+from app.services.answer_cache import AnswerCache, PlanCache, dataset_fingerprint, normalize_question, schema_fingerprint
+
+COLUMNS = {"region": {"dtype": "category"}, "sales": {"dtype": "float64"}}
+ANSWER = {"reply": "West leads.", "tables": [{"region": ["West"], "sales": [3.0]}], "chart_data": None}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "answers.sqlite3")
+
+
+@pytest.mark.parametrize("a,b", [
+    ("Top 5 customers by sales?", "top 5 customers by sales"),
+    ("  top 5   CUSTOMERS by sales!! ", "top 5 customers by sales"),
+    ("sales > 1.5%", "sales 1.5%"),
+])
+def test_normalize_question(a, b):
+    assert normalize_question(a) == b
+
+
+def test_fingerprints():
+    assert schema_fingerprint(COLUMNS) == schema_fingerprint(dict(COLUMNS))
+    assert schema_fingerprint(COLUMNS) != schema_fingerprint({**COLUMNS, "sales": {"dtype": "int64"}})
+    assert dataset_fingerprint("sha256:a", COLUMNS) != dataset_fingerprint("sha256:b", COLUMNS)
+
+
+def test_answers_are_keyed_by_question_and_dataset(path):
+    cache = AnswerCache(path, ttl=60)
+    cache.put("Top regions by sales?", "data-1", ANSWER)
+    assert cache.get("top regions by sales", "data-1") == ANSWER
+    assert cache.get("top regions by sales", "data-2") is None
+    assert cache.get("bottom regions by sales", "data-1") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_answers_survive_a_restart(path):
+    AnswerCache(path, ttl=60).put("q", "data", ANSWER)
+    assert AnswerCache(path, ttl=60).get("q", "data") == ANSWER
+
+
+def test_answers_expire(path, monkeypatch):
+    cache = AnswerCache(path, ttl=60)
+    cache.put("q", "data", ANSWER)
+    now = answer_cache.time.time()
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now + 61)
+    assert cache.get("q", "data") is None
+    cache.put("other", "data", ANSWER)  # writes purge expired rows
+    assert cache._conn().execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 1
+
+
+def test_disabled_cache_never_touches_the_disk(path):
+    cache = AnswerCache(path, ttl=0)
+    cache.put("q", "data", ANSWER)
+    assert cache.get("q", "data") is None and not cache.enabled
+    assert not os.path.exists(path)
+
+
+def test_plans_are_keyed_by_schema_only(path):
+    plans = PlanCache(path, ttl=60)
+    steps = [{"tool": "tool_top_k", "args": {"metric": "sales", "group_by": "region"}}]
+    plans.put("top regions", schema_fingerprint(COLUMNS), steps)
+    assert plans.get("Top regions?", schema_fingerprint(dict(COLUMNS))) == steps
+    assert plans.get("top regions", schema_fingerprint({"region": {"dtype": "category"}})) is None
+    assert AnswerCache(path, ttl=60).get("top regions", schema_fingerprint(COLUMNS)) is None  # own table
@@ -0,0 +1,40 @@
+import numpy as np
+
+from app.services.compact import compact_result, estimate_tokens
+
+TOP_K = {"table": [{"customer": "Ann", "sales": 125719.55}, {"customer": "Bob", "sales": 98211.37}],
+         "used": {"metric": "sales", "group_by": "customer", "agg": "sum"}}
+
+
+def rows(n):
+    return [{"customer": f"Customer {i}", "sales": i * 1234.5678, "note": "x" * 40} for i in range(n)]
+
+
+def test_results_within_budget_are_unchanged():
+    assert compact_result(TOP_K, budget=1000) is TOP_K
+
+
+def test_zero_budget_disables_compaction():
+    big = {"table": rows(500)}
+    assert compact_result(big, budget=0) is big
+
+
+def test_large_results_are_truncated_to_fit():
+    out = compact_result({"table": rows(500)}, budget=300)
+    table = out["table"]
+    assert estimate_tokens(out) <= 300
+    assert table["columns"] == ["customer", "sales", "note"]
+    assert len(table["rows"]) + table["more_rows"] == 500
+    assert table["rows"][1] == ["Customer 1", 1235.0, "x" * 40]  # floats rounded once over budget
+
+
+def test_compaction_tightens_until_it_fits():
+    result = {"table": rows(200)}
+    assert len(compact_result(result, budget=2000)["table"]["rows"]) > len(compact_result(result, budget=200)["table"]["rows"])
+
+
+def test_text_lists_and_special_values():
+    out = compact_result({"text": "y" * 500, "values": list(range(100)), "nan": float("nan"), "np": np.float64(1 / 3)},
+                         budget=100, digits=3)
+    assert out["text"].startswith("y" * 200) and out["text"].endswith("(300 more chars)")
+    assert out["values"][-1].endswith("more") and out["nan"] is None and out["np"] == 0.333
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.agent.tools import _filter_preview
+from app.services.filters import FilterError, compile_filter
+from app.services.indexes import DatasetIndexes
+from app.services.ingest import compact_dtypes, load_dataframe
+from app.services.profile import DatasetProfile
+
+# (compiled filter, equivalent DataFrame.query expression)
+CASES = [
+    ("sales > 500", "sales > 500"),
+    ("sales <= 100 or quantity == 3", "sales <= 100 or quantity == 3"),
+    ("10 <= quantity < 15", "10 <= quantity < 15"),
+    ("quantity between 5 and 8", "5 <= quantity <= 8"),
+    ("sales > quantity", "sales > quantity"),
+    ("sales != quantity", "sales != quantity"),
+    ("region == 'West'", "region == 'West'"),
+    ("region != 'West'", "region != 'West'"),
+    ("region = 'Nowhere'", "region == 'Nowhere'"),
+    ("region in ['West', 'East']", "region in ['West', 'East']"),
+    ("region not in ['West', 'East']", "region not in ['West', 'East']"),
+    ("not region == 'North'", "~(region == 'North')"),
+    ("segment == 'retail' and region in ['West']", "segment == 'retail' and region in ['West']"),
+    ("segment != 'retail' | region == 'South'", "segment != 'retail' or region == 'South'"),
+    ("sales > 300 & region == 'East'", "sales > 300 and region == 'East'"),
+    ("customer contains 'ER_1'", "customer.str.lower().str.contains('er_1', regex=False, na=False)"),
+    ("customer startswith 'cust'", "customer.str.lower().str.startswith('cust', na=False)"),
+    ("order_date >= '2021-03-01'", "order_date >= '2021-03-01'"),
+    ("order_date < '2021-02-01'", "order_date < '2021-02-01'"),
+    ("order_date between '2021-02-01' and '2021-02-28'", "'2021-02-01' <= order_date <= '2021-02-28'"),
+    ("'2021-01-15' <= order_date < '2021-04-01'", "'2021-01-15' <= order_date < '2021-04-01'"),
+    ("'2021-01-15' < order_date <= '2021-04-01' and segment == 'online'",
+     "'2021-01-15' < order_date <= '2021-04-01' and segment == 'online'"),
+    ("order_date > '2021-03-01' or region == 'West'", "order_date > '2021-03-01' or region == 'West'"),
+]
+
+
+@pytest.fixture(scope="module")
+def csv_path(tmp_path_factory):
+    """Orders with missing values in every column kind, unsorted dates and a few duplicates."""
+    rng = np.random.default_rng(7)
+    n = 400
+    df = pd.DataFrame({
+        "region": rng.choice(["West", "East", "North", "South"], n).astype(object),
+        "segment": rng.choice(["retail", "online", "wholesale"], n).astype(object),
+        "customer": [f"Customer_{i % 40}" for i in range(n)],
+        "sales": rng.gamma(2.0, 250.0, n).round(2),
+        "quantity": rng.integers(1, 20, n),
+        "order_date": (pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 120, n), unit="D")).strftime("%Y-%m-%d"),
+    })
+    df.loc[::13, "region"] = None
+    df.loc[::17, "segment"] = None
+    df.loc[::11, "sales"] = np.nan
+    df.loc[::19, "order_date"] = None
+    path = tmp_path_factory.mktemp("filters") / "orders.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def reference(csv_path):
+    # DataFrame.query can't compare Arrow date columns, so the reference is the pandas-engine frame
+    return load_dataframe(csv_path, "pandas")
+
+
+def frame(csv_path, engine, compact):
+    df = load_dataframe(csv_path, engine)
+    if compact:
+        compact_dtypes(df)  # low-cardinality text becomes category, as on upload
+    return df
+
+
+def indexes_for(df):
+    schema = DatasetProfile(df).schema
+    return DatasetIndexes(schema["categorical"], schema["datetime"])
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("indexed", [False, True])
+@pytest.mark.parametrize("text,query", CASES)
+def test_matches_dataframe_query(csv_path, reference, engine, compact, indexed, text, query):
+    df = frame(csv_path, engine, compact)
+    expected = reference.eval(query, engine="python").to_numpy(dtype=bool, na_value=False)
+    plan = compile_filter(text)
+    mask = plan.mask(df, indexes_for(df) if indexed else None)
+    assert mask.dtype == bool and len(mask) == len(df)
+    assert np.array_equal(mask, expected)
+    assert plan.count(df) == int(expected.sum())
+
+
+def test_indexes_are_used(csv_path):
+    df = frame(csv_path, "pandas", compact=True)
+    indexes = indexes_for(df)
+    compile_filter("region == 'West' and order_date >= '2021-02-01'").mask(df, indexes)
+    assert set(indexes.stats()) == {"region", "order_date"}
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_preview_stops_early_with_same_rows(csv_path, reference, engine, monkeypatch):
+    monkeypatch.setattr("app.services.filters.PREVIEW_CHUNK_ROWS", 64)
+    df = frame(csv_path, engine, compact=True)
+    expected = np.flatnonzero(reference.eval("sales > 500 and region == 'West'").to_numpy(dtype=bool, na_value=False))
+    assert list(compile_filter("sales > 500 and region == 'West'").positions(df, limit=5)) == list(expected[:5])
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+@pytest.mark.parametrize("text", [
+    "order_date >= 'not a date'",
+    "order_date > region",
+    "sales > 'abc'",
+    "unknown_column == 1",
+])
+def test_bad_filters_are_reported(csv_path, engine, text):
+    df = frame(csv_path, engine, compact=True)
+    with pytest.raises(FilterError):
+        compile_filter(text).mask(df, indexes_for(df))
+    result = _filter_preview(df, compile_filter(text), 5, True, indexes_for(df))
+    assert result["error"].startswith("Bad filter")
+
+
+@pytest.mark.parametrize("text", ["", "sales >", "sales > 1 and", "region in 'West'", "(sales > 1", "sales ? 3"])
+def test_syntax_errors(text):
+    with pytest.raises(FilterError):
+        compile_filter(text)
@@ -0,0 +1,118 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.frame_store import FrameStore
+
+
+def frame(seed, rows=10_000):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"a": rng.normal(size=rows), "b": rng.integers(0, 100, rows)})
+
+
+def size(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+@pytest.fixture
+def spill_root(tmp_path):
+    return str(tmp_path / "spill")
+
+
+def test_spills_least_recently_used_and_reloads(spill_root):
+    one, two = frame(1), frame(2)
+    store = FrameStore(budget_bytes=size(one) + size(two) // 2, spill_dir=spill_root)
+    store.acquire("one", one)
+    store.acquire("two", two)
+    assert store.stats()["spilled"] == 1 and store.evictions == 1
+    assert os.listdir(store.spill_dir)
+
+    pd.testing.assert_frame_equal(store.get("one"), one)
+    assert store.reloads == 1
+    assert store.stats()["resident"] == 1  # reloading "one" pushed "two" out
+
+
+def test_last_release_removes_the_spill_file(spill_root):
+    store = FrameStore(budget_bytes=1, spill_dir=spill_root)
+    store.acquire("one", frame(1))
+    store.acquire("one")
+    store.acquire("two", frame(2))
+    assert len(os.listdir(store.spill_dir)) == 1
+    store.release("one")
+    assert len(os.listdir(store.spill_dir)) == 1  # still referenced
+    store.release("one")
+    assert os.listdir(store.spill_dir) == []
+    with pytest.raises(KeyError):
+        store.get("one")
+
+
+def test_processes_sharing_a_spill_root_keep_their_own_files(spill_root):
+    # Two workers that spilled the same upload: one releasing it must not break the other
+    a, b = FrameStore(budget_bytes=1, spill_dir=spill_root), FrameStore(budget_bytes=1, spill_dir=spill_root)
+    df = frame(1)
+    for store in (a, b):
+        store.acquire("upload", df)
+        store.acquire("other", frame(2))
+    a.release("upload")
+    pd.testing.assert_frame_equal(b.get("upload"), df)
+
+
+def test_stale_spill_dirs_are_removed(spill_root):
+    store = FrameStore(budget_bytes=1, spill_dir=spill_root)
+    store.acquire("one", frame(1))
+    store.acquire("two", frame(2))
+    dead = next(pid for pid in range(2**22 - 1, 0, -1) if not os.path.exists(f"/proc/{pid}"))
+    for name in (f"{dead}-0000", f"{os.getpid()}-previous", f"{os.getppid()}-live", "notes"):
+        os.makedirs(os.path.join(spill_root, name))
+
+    assert store.remove_stale_spill_dirs() == 2
+    assert sorted(os.listdir(spill_root)) == sorted([os.path.basename(store.spill_dir), f"{os.getppid()}-live", "notes"])
+    store.remove_spill_dir()
+    assert not os.path.exists(store.spill_dir)
+
+
+def test_persisted_frames_load_by_key_in_another_process(tmp_path, spill_root):
+    df = frame(1)
+    writer = FrameStore(spill_dir=spill_root)
+    writer.enable_persistence(str(tmp_path / "tables"))
+    writer.acquire("sha256:abc", df)
+    path = writer.persist("sha256:abc")
+    assert path.endswith(".feather") and writer.stats()["mapped"] == 1
+
+    reader = FrameStore(spill_dir=spill_root)
+    reader.enable_persistence(str(tmp_path / "tables"))
+    pd.testing.assert_frame_equal(reader.acquire("sha256:abc"), df)
+    reader.release("sha256:abc")
+    assert os.path.exists(path)  # durable copies outlive the last reference
+    with pytest.raises(KeyError):
+        reader.acquire("sha256:missing")
+
+
+def test_spill_files_are_written_outside_the_lock(spill_root, monkeypatch):
+    store = FrameStore(budget_bytes=1, spill_dir=spill_root)
+    store.acquire("resident", frame(1))
+    writing, done = threading.Event(), threading.Event()
+    write = FrameStore._write
+
+    def slow_write(self, df, directory, key):
+        writing.set()
+        assert done.wait(5)
+        return write(self, df, directory, key)
+
+    monkeypatch.setattr(FrameStore, "_write", slow_write)
+    evictor = threading.Thread(target=store.acquire, args=("new", frame(2)))  # spills "resident"
+    evictor.start()
+    assert writing.wait(5)
+    try:
+        got = []
+        reader = threading.Thread(target=lambda: got.extend([store.get("resident"), store.stats()]))
+        reader.start()
+        reader.join(2)
+        assert len(got) == 2  # served from memory while its file is written
+    finally:
+        done.set()
+        evictor.join()
+    assert store.stats()["frames"] == 2
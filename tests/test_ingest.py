@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.ingest import compact_dtypes, load_dataframe
+
+ENGINES = ["pandas", "pyarrow"]
+
+
+@pytest.fixture
+def mixed_csv(tmp_path):
+    """Text, numeric, numeric-as-text (with a few junk values) and date columns."""
+    n = 60
+    path = tmp_path / "mixed.csv"
+    pd.DataFrame({
+        "Region": np.resize(["West", "East", "North"], n),
+        "Sales": np.arange(n) * 1.5,
+        "Mostly Numbers": [str(i) if i % 10 else "n/a" for i in range(n)],
+        "Order Date": pd.date_range("2021-01-01", periods=n, freq="D").strftime("%Y-%m-%d"),
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_text_columns_survive(mixed_csv, engine):
+    df = load_dataframe(mixed_csv, engine)
+    assert list(df["region"].iloc[:3]) == ["West", "East", "North"]
+    assert df["region"].notna().all()
+    assert not pd.api.types.is_numeric_dtype(df["region"])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_mostly_numeric_text_is_coerced_with_missing_values(mixed_csv, engine):
+    df = load_dataframe(mixed_csv, engine)
+    col = df["mostly_numbers"]
+    assert pd.api.types.is_numeric_dtype(col)
+    assert int(col.isna().sum()) == 6  # the "n/a" rows are missing, not NaN values
+    assert col.iloc[1] == 1
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_agree(mixed_csv, engine):
+    df = load_dataframe(mixed_csv, engine)
+    base = load_dataframe(mixed_csv, "pandas")
+    assert list(df.columns) == list(base.columns)
+    for c in df.columns:
+        assert df[c].isna().tolist() == base[c].isna().tolist(), c
+    assert df["sales"].astype("float64").tolist() == base["sales"].tolist()
+
+
+def test_compaction_keeps_float_precision():
+    rng = np.random.default_rng(3)
+    n = 2_000_000
+    qty = rng.integers(0, 100_000, n).astype("float64")
+    qty[::7] = np.nan  # blanks make an integer column float
+    df = pd.DataFrame({"group": rng.choice(["a", "b", "c"], n).astype(object), "quantity": qty, "units": rng.integers(0, 200, n)})
+    expected = df.groupby("group")["quantity"].sum()
+    total = df["quantity"].sum()
+
+    memory = compact_dtypes(df)
+    assert df["quantity"].dtype == "float64"
+    assert df["quantity"].sum() == total
+    assert df.groupby("group", observed=True)["quantity"].sum().equals(expected)
+    assert df["units"].dtype == "uint8"  # integers still narrow losslessly
+    assert memory["after"] < memory["before"]
@@ -0,0 +1,134 @@
+import pandas as pd
+import pytest
+
+from app.agent import tools
+from app.agent.planner import plan_message, recordable_plan, replay_plan, result_tables
+from app.agent.router import detect_intent
+
+
+@pytest.fixture(scope="module")
+def df():
+    return pd.DataFrame({
+        "customer_name": ["Ann", "Bob", "Cy"],
+        "region": ["West", "East", "West"],
+        "status": ["open", "closed", "open"],
+        "sales": [10.0, 20.0, 30.0],
+        "quantity": [1, 2, 3],
+        "order_date": pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-03"]),
+    })
+
+
+def top_k(metric, group_by, k=5, agg="sum"):
+    return {"tool": "top_k", "args": {"metric": metric, "group_by": group_by, "k": k, "agg": agg}}
+
+
+def plot(x, y, kind, agg="sum"):
+    return {"tool": "plot", "args": {"x": x, "y": y, "kind": kind, "agg": agg}}
+
+
+DESCRIBE = {"tool": "describe", "args": {}}
+
+CASES = [
+    # top-k shapes
+    ("top 5 customers by sales", top_k("sales", "customer_name")),
+    ("Show me the top 10 regions by total sales?", top_k("sales", "region", k=10)),
+    ("what are the top 3 regions by average quantity", top_k("quantity", "region", k=3, agg="mean")),
+    ("please list top region by sales.", top_k("sales", "region")),
+    ("top 5 regions by count of sales", None),
+    ("top 0 regions by sales", None),
+    ("top 500 regions by sales", None),
+    ("top 5 regions by region", None),
+    ("top 5 sales by region", None),  # metric isn't numeric
+    # plots
+    ("plot sales over order date", plot("order_date", "sales", "line")),
+    ("plot the sales trend over order date", plot("order_date", "sales", "line")),
+    ("chart of average sales by region as a bar chart", plot("region", "sales", "bar", "mean")),
+    ("graph quantity per region as an area chart", plot("region", "quantity", "area")),
+    ("plot count of status by region", plot("region", "status", "bar", "count")),
+    ("plot region by sales", None),  # sum of a text column
+    ("plot sales by sales", None),
+    # describe
+    ("describe the data", DESCRIBE),
+    ("give me a summary of the dataset", DESCRIBE),
+    # plural stripping: -s and -es
+    ("top 2 statuses by quantity", top_k("quantity", "status", k=2)),
+    ("plot sales by regions", plot("region", "sales", "bar")),
+    # compound requests go to the agent
+    ("top 5 regions by sales and quantity", None),
+    ("top 5 customers in west by sales", None),
+    ("top 5 regions by sales where status open", None),
+    ("plot sales by region for 2021", None),
+    ("plot sales by region then quantity", None),
+    # near-miss column names are not guessed
+    ("top 5 customers by sales 2021", None),
+    ("top 5 regions by net sales", None),
+    ("plot sales by regoin", None),
+    ("top 5 regions by salez", None),
+    ("plot sales over order day", None),
+    # other intents
+    ("what's in this file", None),
+    ("filter sales > 10", None),
+]
+
+
+@pytest.mark.parametrize("message,expected", CASES)
+def test_plan_message(df, message, expected):
+    assert plan_message(message, df, detect_intent(message)) == expected
+
+
+def test_only_planned_intents(df):
+    assert plan_message("top 5 customers by sales", df, "CHAT") is None
+
+
+# Recorded agent plans
+
+def call(tool, error=False, **args):
+    return {"tool": tool, "args": {"session_id": "s", **args}, "error": error}
+
+
+def test_recordable_plan():
+    calls = [call("tool_top_k", metric="sales", group_by="region"), call("tool_describe")]
+    assert recordable_plan(calls) == [
+        {"tool": "tool_top_k", "args": {"metric": "sales", "group_by": "region"}},
+        {"tool": "tool_describe", "args": {}},
+    ]
+    assert recordable_plan([]) is None
+    assert recordable_plan(calls + [call("tool_fallback_help", error_context="x")]) is None
+    assert recordable_plan(calls + [call("tool_plot", error=True, x="a", y="b")]) is None
+
+
+@pytest.fixture
+def session(monkeypatch, df):
+    monkeypatch.setattr(tools, "SESSIONS", {})
+    mem = tools.get_or_create_session("s")
+    mem.registry.put("dataset", df)
+    yield mem
+    mem.close()
+
+
+TOP_REGIONS = [{"tool": "tool_top_k", "args": {"metric": "sales", "group_by": "region", "k": 1}}]
+
+
+def test_replay_runs_the_plan_against_current_data(session, df):
+    first = replay_plan("s", TOP_REGIONS + [{"tool": "tool_describe", "args": {}}])
+    assert first["tables"][0] == [{"region": "West", "sales": 40.0}]
+    assert first["reply"].startswith("**Top 1 region by sum of sales:**")
+    assert "statistical summary" in first["reply"]
+
+    session.registry.put("dataset", df.assign(sales=[10.0, 50.0, 30.0]))  # same schema, new rows
+    assert replay_plan("s", TOP_REGIONS)["tables"] == [[{"region": "East", "sales": 50.0}]]
+
+
+def test_replay_gives_up_when_a_step_fails(session):
+    assert replay_plan("s", [{"tool": "tool_top_k", "args": {"metric": "profit", "group_by": "region"}}]) is None
+    assert replay_plan("s", [{"tool": "tool_plot", "args": {"x": "region"}}]) is None  # bad arguments
+
+
+def test_result_tables_in_call_order():
+    results = [
+        {"tool": "tool_top_k", "result": {"table": [{"a": 1}]}},
+        {"tool": "tool_plot", "result": {"table": [{"b": 2}]}},  # chart tables aren't shown twice
+        {"tool": "tool_filter_preview", "result": {"rows": [{"c": 3}]}},
+        {"tool": "tool_describe", "result": {"error": "boom"}},
+    ]
+    assert result_tables(results) == [[{"a": 1}], [{"c": 3}]]
@@ -0,0 +1,74 @@
+import inspect
+
+import pandas as pd
+import pytest
+
+from app.agent import tools
+from app.agent.memory import SessionMemory
+from app.services import result_cache
+from app.services.result_cache import ResultCache
+
+
+def test_computes_once_per_key():
+    cache, calls = ResultCache(max_entries=8), []
+    compute = lambda: calls.append(1) or {"table": [1]}
+    first = cache.get_or_compute(("top_k", "sales"), compute)
+    assert cache.get_or_compute(("top_k", "sales"), compute) is first
+    assert len(calls) == 1
+    assert cache.stats() == {"entries": 1, "max": 8, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_errors_are_not_cached():
+    cache, calls = ResultCache(max_entries=8), []
+    for _ in range(2):
+        cache.get_or_compute("k", lambda: calls.append(1) or {"error": "boom"})
+    assert len(calls) == 2 and cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = ResultCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.get_or_compute(key, lambda: key)
+    cache.get_or_compute("a", lambda: "recomputed")
+    cache.get_or_compute("c", lambda: "c")
+    assert cache.get_or_compute("a", lambda: "recomputed") == "a"
+    assert cache.get_or_compute("b", lambda: "recomputed") == "recomputed"
+    assert cache.evictions == 2
+
+
+def test_size_zero_disables_caching():
+    cache, calls = ResultCache(max_entries=0), []
+    for _ in range(2):
+        cache.get_or_compute("k", lambda: calls.append(1) or {})
+    assert len(calls) == 2
+
+
+def test_totals_count_every_cache():
+    before = result_cache.totals()
+    ResultCache().get_or_compute("k", lambda: 1)
+    after = result_cache.totals()
+    assert after["misses"] == before["misses"] + 1
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(tools, "SESSIONS", {})
+    mem = tools.get_or_create_session("s")
+    mem.registry.put("dataset", pd.DataFrame({"region": ["West", "East", "West"], "sales": [1.0, 2.0, 3.0]}))
+    yield mem
+    mem.close()
+
+
+def top_k(**kwargs):
+    return inspect.unwrap(tools.tool_top_k.entrypoint)(session_id="s", **kwargs)
+
+
+def test_tool_results_are_reused_until_the_table_changes(session):
+    first = top_k(metric="sales", group_by="region")
+    assert top_k(metric="sales", group_by="region") is first
+    assert tools.session_results(session).hits == 1
+
+    session.registry.put("dataset", pd.DataFrame({"region": ["West", "East"], "sales": [5.0, 1.0]}))
+    fresh = top_k(metric="sales", group_by="region")
+    assert fresh["table"] == [{"region": "West", "sales": 5.0}, {"region": "East", "sales": 1.0}]
+    assert tools.session_results(session).hits == 0
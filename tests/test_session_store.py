@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from app.agent import session_store
+from app.agent.memory import SessionMemory
+from app.agent.session_store import DiskSessionStore, InMemorySessionStore
+from app.services.frame_store import FRAMES, FrameStore
+
+
+class Clock:
+    """Stands in for the time module in session_store."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store, "time", clock)
+    return clock
+
+
+def with_table(key, rows=3):
+    mem = SessionMemory()
+    mem.registry.put("dataset", pd.DataFrame({"region": ["West"] * rows, "sales": range(rows)}), key=key)
+    return mem
+
+
+# In-memory store
+
+def test_idle_sessions_expire(clock):
+    store = InMemorySessionStore(ttl=60, max_sessions=10)
+    store["a"], store["b"] = SessionMemory(), SessionMemory()
+    clock.now += 50
+    store["a"]  # touching a session keeps it alive
+    clock.now += 20
+    assert "b" not in store and store.expired == 1
+    assert "a" in store
+    clock.now += 61
+    assert store.sweep() == 1 and len(store) == 0
+
+
+def test_least_recently_used_session_is_evicted_and_closed(clock):
+    store = InMemorySessionStore(ttl=0, max_sessions=2)
+    first = with_table("lru:first")
+    store["first"], store["second"] = first, SessionMemory()
+    store["first"]
+    store["third"] = SessionMemory()
+    assert list(store) == ["first", "third"] and store.evicted == 1
+    store["fourth"] = SessionMemory()
+    assert "first" not in store and first.registry.tables == {}
+    assert "lru:first" not in FRAMES
+
+
+def test_replacing_a_session_closes_the_old_one(clock):
+    store = InMemorySessionStore(ttl=0, max_sessions=10)
+    old = with_table("replace:old")
+    store["s"] = old
+    store["s"] = SessionMemory()
+    assert old.registry.tables == {} and store.reclaimed_bytes > 0
+
+
+def test_cached_does_not_expire(clock):
+    store = InMemorySessionStore(ttl=60, max_sessions=10)
+    store["s"] = SessionMemory()
+    clock.now += 61
+    assert store.cached("s") and store.expired == 0
+
+
+# Disk store
+
+@pytest.fixture
+def disk(tmp_path, monkeypatch):
+    """A factory for disk stores sharing one database and table directory, like workers."""
+    monkeypatch.setattr(FRAMES, "persist_dir", None)
+    stores = []
+
+    def make(**kwargs):
+        kwargs = {"ttl": 0, "max_sessions": 100, **kwargs}
+        store = DiskSessionStore(db_path=str(tmp_path / "sessions.sqlite3"), data_dir=str(tmp_path / "tables"), **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        for sid in list(store._sessions):
+            store._drop(sid)
+
+
+def test_sessions_survive_a_restart(disk):
+    store = disk()
+    mem = with_table("disk:restart")
+    mem.remember("date_col", "order_date")
+    mem.history.append({"role": "user", "content": "hi"})
+    store["s"] = mem
+
+    restarted = disk()
+    assert not restarted.cached("s")
+    assert "s" in restarted
+    loaded = restarted["s"]
+    assert loaded.recall("date_col") == "order_date" and loaded.history == mem.history
+    assert loaded.registry.active == "dataset"
+    pd.testing.assert_frame_equal(loaded.registry.get(), mem.registry.get(), check_dtype=False)
+
+
+def test_other_workers_see_newer_versions(disk):
+    a, b = disk(), disk()
+    a["s"] = SessionMemory()
+    assert "s" in b
+    a["s"].remember("k", 1)
+    a.save("s")
+    assert b["s"].recall("k") is None  # cached until the next request refreshes it
+    b.refresh("s")
+    assert b["s"].recall("k") == 1
+
+
+def test_concurrent_saves_get_distinct_versions(disk):
+    workers = [disk() for _ in range(4)]
+    workers[0]["s"] = SessionMemory()
+    for w in workers:
+        assert "s" in w
+    versions = []
+
+    def save(w):
+        for _ in range(10):
+            w.save("s")
+            versions.append(w._versions["s"])
+
+    threads = [threading.Thread(target=save, args=(w,)) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(versions) == list(range(2, 42))
+
+
+def test_refresh_drops_sessions_deleted_elsewhere(disk):
+    a, b = disk(), disk()
+    a["s"] = SessionMemory()
+    assert "s" in b
+    del a["s"]
+    b.refresh("s")
+    assert not b.cached("s") and "s" not in b
+
+
+def test_lookups_do_not_touch_the_database(disk):
+    store = disk()
+    store["s"] = SessionMemory()
+    statements = []
+    store._db.set_trace_callback(statements.append)
+    for _ in range(20):
+        assert "s" in store
+        store["s"]
+    assert statements == []
+
+
+def test_expired_sessions_are_swept(disk, clock):
+    store = disk(ttl=60)
+    store["old"], store["new"] = SessionMemory(), SessionMemory()
+    clock.now += 30
+    store.save("new")
+    clock.now += 40
+    assert store.sweep() == 1
+    assert not store.cached("old") and store.cached("new")
+    assert "old" not in disk(ttl=60)
+
+
+def test_orphan_files_are_kept_for_a_grace_period(disk):
+    store = disk()
+    store["s"] = with_table("disk:kept")
+    tables = store.frames.persist_dir
+    orphan_old, orphan_new = (os.path.join(tables, f"{name}.feather") for name in ("orphan_old", "orphan_new"))
+    for path in (orphan_old, orphan_new):
+        open(path, "wb").close()
+    stale = time.time() - session_store.ORPHAN_FILE_GRACE_SECONDS - 1
+    os.utime(orphan_old, (stale, stale))
+    referenced = os.path.join(tables, FrameStore.file_stem("disk:kept") + ".feather")
+    os.utime(referenced, (stale, stale))
+
+    store.sweep()
+    assert not os.path.exists(orphan_old)
+    assert os.path.exists(orphan_new) and os.path.exists(referenced)
+
+
+def test_save_writes_tables_without_blocking_other_sessions(disk, monkeypatch):
+    store = disk()
+    store["other"] = with_table("disk:other")
+    writing, done = threading.Event(), threading.Event()
+    write = FrameStore._write
+
+    def slow_write(self, df, directory, key):
+        if key == "disk:big":
+            writing.set()
+            assert done.wait(5)
+        return write(self, df, directory, key)
+
+    monkeypatch.setattr(FrameStore, "_write", slow_write)
+    saver = threading.Thread(target=store.__setitem__, args=("big", with_table("disk:big")))
+    saver.start()
+    assert writing.wait(5)
+    try:
+        # While the big table is being written: lookups, refreshes, stats and other frames
+        finished = []
+        probe = threading.Thread(target=lambda: finished.extend([
+            "other" in store, store.refresh("other"), store.stats(), len(store["other"].registry.get()),
+            FRAMES.stats(),
+        ]))
+        probe.start()
+        probe.join(2)
+        assert len(finished) == 5
+    finally:
+        done.set()
+        saver.join()
+    assert store._versions["big"] == 1  # saved once, by __setitem__
+
+
+def test_cached_never_loads_evicted_sessions(disk):
+    store = disk(max_sessions=1)
+    store["a"], store["b"] = SessionMemory(), SessionMemory()
+    statements = []
+    store._db.set_trace_callback(statements.append)
+    assert not store.cached("a") and store.cached("b")
+    assert statements == [] and list(store) == ["b"]
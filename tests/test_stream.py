@@ -0,0 +1,42 @@
+import time
+
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.agent import agent as agent_module
+from app.agent.stub_llm import ScriptedModel
+
+
+@pytest.fixture
+def session(monkeypatch, tmp_path):
+    monkeypatch.setattr(agent_module, "get_llm", lambda: ScriptedModel(latency_ms=200))
+    path = tmp_path / "orders.csv"
+    path.write_text("customer,region,sales,order_date\nAnn,West,1,2021-01-01\nBob,East,2,2021-01-02\n")
+    with open(path, "rb") as fh:
+        sid = TestClient(main.app).post("/upload", files={"file": ("orders.csv", fh)}).json()["session_id"]
+    saves = []
+    save = main.SESSIONS.save
+    monkeypatch.setattr(main.SESSIONS, "save", lambda s: (saves.append(time.monotonic()), save(s)))
+    return sid, saves
+
+
+def test_disconnect_keeps_session_locked_until_the_turn_finishes(session):
+    sid, saves = session
+    body = main.ChatIn(session_id=sid, message="Which customers have the highest sales?", use_cache=False)
+
+    async def run():
+        async with anyio.create_task_group() as tg:
+            async def client():
+                async for _ in main._sse_events(sid, body, main.start_trace()):
+                    tg.cancel_scope.cancel()  # disconnect after the first event
+            tg.start_soon(client)
+        # The worker ran the whole turn (two model calls) before the lock was released
+        assert not main.session_lock(sid).locked()
+        assert len(saves) == 1
+        assert main.SESSIONS[sid].tool_results == []
+
+    start = time.monotonic()
+    anyio.run(run)
+    assert saves[0] - start >= 0.4
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+from agno.models.message import Message
+
+from app.agent.stub_llm import ScriptedModel
+
+CONTEXT = """[SESSION_ID: abc-123]
+[DATA_CONTEXT]
+Dataset has 100 rows and 5 columns.
+categorical: region, segment
+smart_columns: region=region, sales=sales
+[/DATA_CONTEXT]
+"""
+
+
+def tool_calls(question, context=CONTEXT):
+    response = ScriptedModel(latency_ms=0)._respond([Message(role="user", content=context + question)])
+    return [(c["function"]["name"], json.loads(c["function"]["arguments"])) for c in response["tool_calls"]]
+
+
+@pytest.mark.parametrize("question,tools", [
+    ("Anything interesting in here?", ["tool_suggest_analysis"]),  # default rule, despite `region` in the context
+    ("How do the regions compare?", ["tool_top_k", "tool_plot"]),
+    ("Plot the sales trend over time", ["tool_plot"]),
+])
+def test_rules_match_the_question_only(question, tools):
+    assert [name for name, _ in tool_calls(question)] == tools
+
+
+def test_session_id_is_filled_in():
+    assert tool_calls("Describe the data")[0][1]["session_id"] == "abc-123"
+
+
+def test_reply_after_tool_results():
+    messages = [Message(role="user", content=CONTEXT + "Describe the data"), Message(role="tool", content="{}")]
+    response = ScriptedModel(latency_ms=0)._respond(messages)
+    assert response["tool_calls"] == [] and response["content"] == "Here is a statistical summary of the dataset."